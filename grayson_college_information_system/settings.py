@@ -152,6 +152,9 @@ DATETIME_INPUT_FORMATS = [
     "%Y-%m-%d %H:%M:%S",
 ]
 
+# engine for the GCIS vs CAMS change summary: "python", "pandas" or "sql"
+GCIS_CAMS_DIFF_ENGINE = "python"
+
 # login and logout
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
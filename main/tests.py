@@ -1,3 +1,35 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 
-# Create your tests here.
+from scheduling.query_budget import QueryBudgetMixin
+
+
+class MainQueryBudgetTests(QueryBudgetMixin, TestCase):
+    urlconf = "main.urls"
+    BUDGETS = {
+        "home": 5,
+        "password_reset": 5,
+        "password_reset_done": 5,
+        "password_reset_confirm": 6,
+        "password_reset_complete": 5,
+        "signup": 5,
+        "login": 5,
+        "logout": 4,
+        "account": 6,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("coordinator", "coordinator@grayson.edu")
+
+    def seed(self, size):
+        for n in range(User.objects.count(), size * 10):
+            User.objects.create_user(f"user{n}", f"user{n}@grayson.edu")
+        # a valid token is moved to the session on first use, an expired one
+        # renders the same page every time
+        self.url_kwargs = {
+            "uidb64": urlsafe_base64_encode(force_bytes(self.user.pk)),
+            "token": "expired-token",
+        }
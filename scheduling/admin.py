@@ -4,7 +4,7 @@ from django.db import models
 from django.db.models.functions import Concat
 
 # Register your models here.
-from .models import Course, Campus, Dates, Instructor, Location, Term, Schedule, Cams
+from .models import Course, Campus, ChangeSummarySnapshot, Dates, Instructor, Location, RoomOccupancySnapshot, ScheduleSummarySnapshot, Term, Schedule, Cams, CamsLoad
 
 admin.site.register(Term)
 
@@ -66,8 +66,23 @@ class InstructorAdmin(admin.ModelAdmin):
 
 admin.site.register(Campus)
 
-admin.site.register(Cams)
+@admin.register(Cams)
+class CamsAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "term", "load")
+    # rows of staged and retired loads are listed too
+    list_filter = ("load__status", "term")
+
+
+@admin.register(CamsLoad)
+class CamsLoadAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "term", "status", "created_at", "activated_at")
+    list_filter = ("status", "term")
+    ordering = ("-created_at",)
 
 admin.site.register(Location)
 
 admin.site.register(Dates)
+
+admin.site.register(ChangeSummarySnapshot)
+admin.site.register(RoomOccupancySnapshot)
+admin.site.register(ScheduleSummarySnapshot)
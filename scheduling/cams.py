@@ -0,0 +1,650 @@
+"""Load CAMS extracts into the Cams table.
+
+An extract is a CSV file with a header row of CAMS_CSV_COLUMNS, one row per
+section. It is read and written in fixed-size batches, so memory does not
+grow with the size of the file. A load replaces the CAMS rows of every term
+in the extract, an incremental load compares row fingerprints and only
+writes the sections that changed. Either way the whole extract is loaded in
+a single transaction, so readers see the old or the new rows of a term.
+
+A full load is staged as a new CamsLoad next to the live one. Once it is
+complete, validated and committed, it is switched live in a short
+transaction of its own. The previous load is kept, rollback_cams_load
+switches back to it. Incremental loads update the live load in place.
+
+load_cams_parallel loads the terms of an extract in separate processes, each
+term in its own transaction.
+"""
+import csv
+import io
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+import django
+from django.apps import apps
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import (
+    CAMS_FINGERPRINT_FIELDS,
+    MEETING_PATTERN_FIELDS,
+    Campus,
+    Cams,
+    CamsLoad,
+    Course,
+    Dates,
+    Instructor,
+    Location,
+    Term,
+    delete_without_signals,
+    get_cams_fingerprint,
+    get_live_cams_load,
+    get_meeting_pattern,
+    invalidate_change_summary,
+)
+from .resolvers import NaturalKeyResolver, parse_instructor
+
+CAMS_CSV_COLUMNS = [
+    "Term",
+    "Subject",
+    "Number",
+    "Section",
+    "Capacity",
+    "Status",
+    "Instructor",
+    "Campus",
+    "Building",
+    "Room",
+    "Days",
+    "Start",
+    "Stop",
+]
+
+# Cams columns in the order CamsLoader builds its rows
+CAMS_LOAD_FIELDS = [
+    "term_id",
+    "course_id",
+    "section",
+    "capacity",
+    "instructor_id",
+    "status",
+    "campus_id",
+    "location_id",
+    "days",
+    "start_time",
+    "stop_time",
+    "fingerprint",
+    *MEETING_PATTERN_FIELDS,
+]
+
+COURSE = CAMS_LOAD_FIELDS.index("course_id")
+SECTION = CAMS_LOAD_FIELDS.index("section")
+FINGERPRINT = CAMS_LOAD_FIELDS.index("fingerprint")
+
+# retired loads kept per term for a rollback
+CAMS_LOADS_KEPT = 1
+
+TERM_PATTERN = re.compile(r"^(FALL|SPRING|SUMMER)\s*(\d{4})$")
+
+DAYS = "MTWRFSU"
+
+
+class CamsLoadError(Exception):
+    """the extract can not be loaded, nothing was written"""
+
+
+@lru_cache(maxsize=4096)
+def parse_time(value):
+    """a time in one of TIME_INPUT_FORMATS, None if empty"""
+    value = value.strip()
+    if not value:
+        return None
+    for time_format in settings.TIME_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, time_format).time()
+        except ValueError:
+            pass
+    raise ValueError(f"invalid time {value!r}")
+
+
+def parse_days(value):
+    """days in DAYS order, "w m" -> "MW", None if empty"""
+    days = value.replace(" ", "").upper()
+    if not days:
+        return None
+    if set(days) - set(DAYS) or len(set(days)) != len(days):
+        raise ValueError(f"invalid days {value!r}")
+    return "".join(day for day in DAYS if day in days)
+
+
+def parse_term(value):
+    """(semester, year) of FALL2023 or Fall 2023"""
+    match = TERM_PATTERN.match(value.strip().upper())
+    if not match:
+        raise ValueError(f"invalid term {value!r}")
+    return match.group(1), int(match.group(2))
+
+
+def check_cams_fields(row):
+    """ValueError if csv.DictReader found fewer or more fields than columns"""
+    missing = [column for column in CAMS_CSV_COLUMNS if row.get(column) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if row.get(None):
+        raise ValueError(f"{len(row[None])} field(s) too many")
+
+
+def check_max_length(label, model, field, value):
+    """ValueError if value does not fit the field of model"""
+    max_length = model._meta.get_field(field).max_length
+    if value and len(value) > max_length:
+        raise ValueError(f"{label} longer than {max_length} characters: {value!r}")
+
+
+def normalize_cams_row(row):
+    """validated values of an extract row, ValueError if it is invalid"""
+    check_cams_fields(row)
+    term = parse_term(row["Term"])
+
+    section = row["Section"].strip().upper()
+    if not section or len(section) > Cams._meta.get_field("section").max_length:
+        raise ValueError(f"invalid section {row['Section']!r}")
+
+    try:
+        capacity = int(row["Capacity"])
+    except ValueError:
+        raise ValueError(f"invalid capacity {row['Capacity']!r}") from None
+
+    status = row["Status"].strip().upper() or "OPEN"
+    if status not in dict(Cams.STATUS_CHOICES):
+        raise ValueError(f"invalid status {row['Status']!r}")
+
+    start_time, stop_time = parse_time(row["Start"]), parse_time(row["Stop"])
+    if (start_time is None) != (stop_time is None) or (
+        start_time and start_time > stop_time
+    ):
+        raise ValueError(f"invalid times {row['Start']!r} to {row['Stop']!r}")
+
+    # longer values would abort the whole load in the database
+    course = (row["Subject"].strip().upper(), row["Number"].strip())
+    instructor = parse_instructor(row["Instructor"])
+    campus = row["Campus"].strip()
+    location = (row["Building"].strip(), row["Room"].strip())
+    first_name, last_name = instructor or (None, None)
+    for label, model, field, value in [
+        ("subject", Course, "subject", course[0]),
+        ("number", Course, "number", course[1]),
+        ("instructor first name", Instructor, "first_name", first_name),
+        ("instructor last name", Instructor, "last_name", last_name),
+        ("campus", Campus, "name", campus),
+        ("building", Location, "building", location[0]),
+        ("room", Location, "room", location[1]),
+    ]:
+        check_max_length(label, model, field, value)
+
+    return {
+        "term": term,
+        "course": course,
+        "section": section,
+        "capacity": capacity,
+        "instructor": instructor,
+        "status": status,
+        "campus": campus,
+        "location": location,
+        "days": parse_days(row["Days"]),
+        "start_time": start_time,
+        "stop_time": stop_time,
+    }
+
+
+def get_cams_reader(f):
+    reader = csv.DictReader(f)
+    missing = set(CAMS_CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise CamsLoadError(f"missing columns: {', '.join(sorted(missing))}")
+    return reader
+
+
+def read_cams_extract(f, batch_size=5000, terms=None):
+    """yield batches of (line, row, values, error) of an extract
+
+    values are normalize_cams_row() of a valid row, error the reason an
+    invalid row is rejected. Only rows of terms are read if given, rows with
+    an invalid term are then skipped, see scan_cams_extract.
+    """
+    reader = get_cams_reader(f)
+    batch = []
+    for row in reader:
+        if terms is not None:
+            try:
+                if parse_term(row["Term"] or "") not in terms:
+                    continue
+            except ValueError:
+                continue
+        try:
+            batch.append((reader.line_num, row, normalize_cams_row(row), None))
+        except ValueError as e:
+            batch.append((reader.line_num, row, None, str(e)))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scan_cams_extract(f):
+    """(terms, instructors, locations, rows with an invalid term) of an extract
+
+    a quick pass before the terms are loaded separately, rows are not
+    validated otherwise.
+    """
+    terms, instructors, locations, rejected = set(), set(), set(), []
+    reader = get_cams_reader(f)
+    for row in reader:
+        try:
+            terms.add(parse_term(row["Term"] or ""))
+        except ValueError as e:
+            rejected.append((reader.line_num, row, str(e)))
+            continue
+        try:
+            check_cams_fields(row)
+        except ValueError:
+            # rejected when its term is loaded
+            continue
+        instructors.add(parse_instructor(row["Instructor"]))
+        locations.add((row["Building"].strip(), row["Room"].strip()))
+    return terms, instructors, locations, rejected
+
+
+class CamsLoader:
+    """load CAMS extracts batch by batch, see NaturalKeyResolver for foreign keys"""
+
+    def __init__(self, incremental=False, batch_size=5000, max_rejects=0, terms=None):
+        self.incremental = incremental
+        self.batch_size = batch_size
+        self.max_rejects = max_rejects
+        # (semester, year) to load, all terms in the extract if None
+        self.load_terms = terms
+
+        self.counts = {}
+        # CamsLoad rows are written to, per term
+        self.loads = {}
+        self.lines = 0
+        self.rejected = 0
+        # per term, (course id, section): (pk, fingerprint) of CAMS rows not
+        # in the extract so far
+        self.existing = {}
+        self.to_delete = {}
+        self.changed_courses = defaultdict(set)
+
+        self.terms = {(t.semester, t.year): t for t in Term.objects.all()}
+        self.resolver = NaturalKeyResolver()
+
+    def load(self, f, progress=None, reject=None):
+        """load an extract, {term: counts}
+
+        progress(lines, rejected) is called after every batch and
+        reject(line, row, error) for every rejected row.
+        """
+        with transaction.atomic():
+            for batch in read_cams_extract(f, self.batch_size, self.load_terms):
+                valid = []
+                for line, row, values, error in batch:
+                    if error is None:
+                        try:
+                            values = self.resolve(values)
+                        except ValueError as e:
+                            error = str(e)
+                    if error is None:
+                        valid.append(values)
+                    else:
+                        self.rejected += 1
+                        if reject:
+                            reject(line, row, error)
+
+                self.resolver.create_missing(
+                    instructors=[values["instructor"] for values in valid],
+                    locations=[values["location"] for values in valid],
+                )
+                rows = defaultdict(list)
+                for values in valid:
+                    rows[values["term"]].append(self.build(values))
+                for term, term_rows in rows.items():
+                    self.load_batch(term, term_rows)
+
+                self.lines += len(batch)
+                if progress:
+                    progress(self.lines, self.rejected)
+
+            if self.rejected > self.max_rejects:
+                raise CamsLoadError(f"{self.rejected} invalid row(s), nothing loaded")
+            self.finish()
+
+        # staged loads are committed before they go live, a switch never
+        # waits for the writes of a load
+        if not self.incremental:
+            for load in self.loads.values():
+                activate_cams_load(load)
+        if self.loads:
+            stamp_cams_update()
+        return self.counts
+
+    def resolve(self, values):
+        """normalized row values with term, course and campus instances"""
+        try:
+            term = self.terms[values["term"]]
+        except KeyError:
+            raise ValueError("unknown term {}{}".format(*values["term"])) from None
+        return dict(
+            values,
+            term=term,
+            course=self.resolver.course(values["course"]),
+            campus=self.resolver.campus(values["campus"]),
+        )
+
+    def build(self, values):
+        """CAMS_LOAD_FIELDS values of resolved row values"""
+        instructor = self.resolver.instructor(values["instructor"])
+        location = self.resolver.location(values["location"])
+        campus = values["campus"]
+        content = [
+            values["capacity"],
+            instructor and instructor.pk,
+            values["status"],
+            campus and campus.pk,
+            location and location.pk,
+            values["days"],
+            values["start_time"],
+            values["stop_time"],
+        ]
+        return (
+            values["term"].pk,
+            values["course"].pk,
+            values["section"],
+            *content,
+            get_cams_fingerprint(content),
+            # bulk loads skip the pre_save receiver that sets these
+            *get_meeting_pattern(
+                values["section"], values["days"], values["start_time"], values["stop_time"]
+            ),
+        )
+
+    def start_term(self, term):
+        """stage a new load of a term, or read the live one to update"""
+        self.counts[term] = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        if not self.incremental:
+            # retired, not deleted, when the new load goes live
+            self.counts[term]["deleted"] = Cams.live.filter(term=term).count()
+            self.loads[term] = CamsLoad.objects.create(term=term)
+            return
+
+        self.loads[term] = get_live_cams_load(term.pk)
+        existing, to_delete = {}, []
+        for pk, course_id, section, fingerprint in (
+            Cams.live.filter(term=term)
+            .order_by("pk")
+            .values_list("pk", "course_id", "section", "fingerprint")
+        ):
+            if (course_id, section) in existing:
+                # a section entered twice by hand, keep the first one
+                to_delete.append(pk)
+                self.changed_courses[term].add(course_id)
+            else:
+                existing[course_id, section] = (pk, fingerprint)
+        self.existing[term] = existing
+        self.to_delete[term] = to_delete
+
+    def load_batch(self, term, rows):
+        if term not in self.counts:
+            self.start_term(term)
+        counts = self.counts[term]
+
+        if not self.incremental:
+            insert_cams(rows, self.loads[term].pk, self.batch_size)
+            counts["inserted"] += len(rows)
+            return
+
+        existing = self.existing[term]
+        to_insert, to_update = [], []
+        for values in rows:
+            pk, fingerprint = existing.pop((values[COURSE], values[SECTION]), (None, None))
+            if pk is None:
+                to_insert.append(values)
+                self.changed_courses[term].add(values[COURSE])
+            elif fingerprint != values[FINGERPRINT]:
+                to_update.append(Cams(pk=pk, **dict(zip(CAMS_LOAD_FIELDS, values))))
+                self.changed_courses[term].add(values[COURSE])
+            else:
+                counts["unchanged"] += 1
+
+        insert_cams(to_insert, self.loads[term].pk, self.batch_size)
+        Cams.objects.bulk_update(
+            to_update,
+            CAMS_FINGERPRINT_FIELDS + ["fingerprint"] + MEETING_PATTERN_FIELDS,
+            batch_size=self.batch_size,
+        )
+        counts["inserted"] += len(to_insert)
+        counts["updated"] += len(to_update)
+
+    def finish(self):
+        """delete missing rows of updated loads, validate every load"""
+        for term, load in self.loads.items():
+            if self.incremental:
+                self.delete_missing(term)
+
+            # checked in the database, remembering every key would make
+            # memory grow with the extract
+            duplicates = (
+                Cams.objects.filter(load=load)
+                .values("course__subject", "course__number", "section")
+                .annotate(count=Count("id"))
+                .filter(count__gt=1)
+                .order_by("course__subject", "course__number", "section")
+            )
+            if duplicates:
+                raise CamsLoadError(
+                    f"duplicate sections in {term}, nothing loaded: "
+                    + ", ".join(
+                        f"{d['course__subject']}{d['course__number']} {d['section']}"
+                        for d in duplicates[:20]
+                    )
+                )
+
+    def delete_missing(self, term):
+        """delete the CAMS rows of a term the extract did not have"""
+        to_delete = self.to_delete[term]
+        for (course_id, _), (pk, _) in self.existing[term].items():
+            to_delete.append(pk)
+            self.changed_courses[term].add(course_id)
+        for i in range(0, len(to_delete), self.batch_size):
+            # invalidated below, once per term
+            delete_without_signals(
+                Cams.objects.filter(pk__in=to_delete[i : i + self.batch_size])
+            )
+        self.counts[term]["deleted"] = len(to_delete)
+
+        if self.changed_courses[term]:
+            subjects = Course.objects.filter(
+                pk__in=self.changed_courses[term]
+            ).values_list("subject", flat=True)
+            invalidate_change_summary(term.pk, set(subjects))
+
+
+def load_cams_term(path, term, incremental=False, batch_size=5000, max_rejects=0):
+    """load the rows of one term, run in a worker process of load_cams_parallel"""
+    if not apps.ready:
+        # spawned rather than forked worker
+        django.setup()
+    started = time.perf_counter()
+    loader = CamsLoader(incremental, batch_size, max_rejects, terms={term})
+    rejected = []
+
+    def reject(line, row, error):
+        rejected.append((line, row, error))
+
+    result = {"term": "{}{}".format(*term), "counts": {}, "error": None}
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            result["counts"] = next(iter(loader.load(f, reject=reject).values()), {})
+    except CamsLoadError as e:
+        result["error"] = str(e)
+    finally:
+        connections.close_all()
+    result.update(
+        rejected=rejected,
+        lines=loader.lines,
+        resolver=loader.resolver.report(),
+        seconds=time.perf_counter() - started,
+    )
+    return result
+
+
+def load_cams_parallel(path, workers, incremental=False, batch_size=5000, max_rejects=0):
+    """load every term of an extract in a process pool
+
+    Returns (results, rejected): a load_cams_term() result per term, and the
+    rows with an invalid term, which no worker loads. Nothing is loaded if
+    there are more of those than max_rejects.
+
+    Every term is loaded on its own: max_rejects applies to each term, and a
+    term that fails leaves the others loaded. A worker that raised gives a
+    result with the error like a rejected load.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        terms, instructors, locations, rejected = scan_cams_extract(f)
+    if len(rejected) > max_rejects:
+        return [], rejected
+
+    # create new names once up front rather than in several workers at a time
+    NaturalKeyResolver().create_missing(instructors, locations)
+
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            term: executor.submit(
+                load_cams_term, path, term, incremental, batch_size, max_rejects
+            )
+            for term in sorted(terms)
+        }
+        results = []
+        for term, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(
+                    {
+                        "term": "{}{}".format(*term),
+                        "counts": {},
+                        "error": f"{e.__class__.__name__}: {e}",
+                        "rejected": [],
+                        "lines": 0,
+                        "resolver": {},
+                        "seconds": 0,
+                    }
+                )
+        return results, rejected
+
+
+def activate_cams_load(load):
+    """make a staged load the live CAMS rows of its term, keep the live one"""
+    with transaction.atomic():
+        CamsLoad.objects.filter(term_id=load.term_id, status=CamsLoad.LIVE).update(
+            status=CamsLoad.RETIRED
+        )
+        load.status = CamsLoad.LIVE
+        load.activated_at = timezone.now()
+        load.save(update_fields=["status", "activated_at"])
+        invalidate_change_summary(load.term_id)
+    transaction.on_commit(lambda: prune_cams_loads(load.term_id))
+
+
+def rollback_cams_load(term):
+    """swap the live load of a term with the previous one, False if there is none
+
+    Rolling back twice returns to the load that was live at first.
+    """
+    with transaction.atomic():
+        loads = CamsLoad.objects.select_for_update().filter(term=term)
+        previous = (
+            loads.filter(status=CamsLoad.RETIRED).order_by("-activated_at", "-pk").first()
+        )
+        if previous is None:
+            return False
+        loads.filter(status=CamsLoad.LIVE).update(status=CamsLoad.RETIRED)
+        previous.status = CamsLoad.LIVE
+        previous.activated_at = timezone.now()
+        previous.save(update_fields=["status", "activated_at"])
+        invalidate_change_summary(term.pk)
+    return True
+
+
+def prune_cams_loads(term_id, keep=CAMS_LOADS_KEPT):
+    """delete all but the keep latest retired loads of a term with their rows"""
+    retired = (
+        CamsLoad.objects.filter(term_id=term_id, status=CamsLoad.RETIRED)
+        .order_by("-activated_at", "-pk")
+        .values_list("pk", flat=True)
+    )
+    pruned = list(retired[keep:])
+    # rows of retired loads are in no change summary
+    delete_without_signals(Cams.objects.filter(load__in=pruned))
+    CamsLoad.objects.filter(pk__in=pruned).delete()
+
+
+def insert_cams(rows, load_id, batch_size=5000):
+    """insert tuples of CAMS_LOAD_FIELDS into a load, with COPY on PostgreSQL"""
+    if connection.vendor != "postgresql":
+        Cams.objects.bulk_create(
+            (
+                Cams(load_id=load_id, **dict(zip(CAMS_LOAD_FIELDS, values)))
+                for values in rows
+            ),
+            batch_size=batch_size,
+        )
+        return
+
+    load_id = str(load_id)
+    buffer = io.StringIO()
+    for values in rows:
+        buffer.write("\t".join(copy_value(value) for value in values))
+        buffer.write(f"\t{load_id}\n")
+    buffer.seek(0)
+
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(
+        quote_name(Cams._meta.get_field(field).column)
+        for field in CAMS_LOAD_FIELDS + ["load_id"]
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote_name(Cams._meta.db_table)} ({columns}) FROM STDIN", buffer
+        )
+
+
+def copy_value(value):
+    """value in COPY text format"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def stamp_cams_update():
+    dates = Dates.objects.order_by("pk").first()
+    if dates is None:
+        Dates.objects.create(cams_update_at=timezone.now())
+    else:
+        dates.cams_update_at = timezone.now()
+        dates.save(update_fields=["cams_update_at"])
@@ -0,0 +1,592 @@
+"""Reconcile GCIS schedules against CAMS.
+
+Each engine returns a GcisCamsDiff holding primary keys only, hydrate_diff
+turns those keys into model instances for the views.
+"""
+import logging
+import time
+from collections import defaultdict
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .models import Cams, ChangeSummarySnapshot, Course, Schedule
+
+logger = logging.getLogger(__name__)
+
+# columns compared between GCIS and CAMS
+DIFF_FIELDS = (
+    "term_id",
+    "course_id",
+    "section",
+    "capacity",
+    "instructor_id",
+    "status",
+    "campus_id",
+    "location_id",
+    "days",
+    "start_time",
+    "stop_time",
+)
+
+# a schedule is identified by term, course and section
+KEY_FIELDS = ("term_id", "course_id", "section")
+
+# text columns, an empty string on either side is compared as null
+BLANK_AS_NULL_FIELDS = ("section", "status", "days")
+
+
+class GcisCamsDiff:
+    """ids of the schedules that differ between GCIS and CAMS"""
+
+    def __init__(self):
+        self.gcis_changed = []
+        self.cams_changed = []
+        self.added = []
+        self.deleted_gcis = []
+        self.deleted_cams = []
+        self.total_changes = 0
+        self.gcis_changed_cols = defaultdict(set)
+        self.cams_changed_cols = defaultdict(set)
+        self.timings = {}
+
+    # lists of ids kept by to_dict and from_dict
+    ID_LISTS = ("gcis_changed", "cams_changed", "added", "deleted_gcis", "deleted_cams")
+
+    def to_dict(self):
+        """json friendly copy for ChangeSummarySnapshot"""
+        data = {name: getattr(self, name) for name in self.ID_LISTS}
+        data["total_changes"] = self.total_changes
+        data["gcis_changed_cols"] = {
+            col: sorted(ids) for col, ids in self.gcis_changed_cols.items()
+        }
+        data["cams_changed_cols"] = {
+            col: sorted(ids) for col, ids in self.cams_changed_cols.items()
+        }
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        diff = cls()
+        for name in cls.ID_LISTS:
+            setattr(diff, name, list(data.get(name, [])))
+        diff.total_changes = data.get("total_changes", 0)
+        for col, ids in data.get("gcis_changed_cols", {}).items():
+            diff.gcis_changed_cols[col].update(ids)
+        for col, ids in data.get("cams_changed_cols", {}).items():
+            diff.cams_changed_cols[col].update(ids)
+        return diff
+
+    def extend(self, other):
+        """append the changes of another subject"""
+        for name in self.ID_LISTS:
+            getattr(self, name).extend(getattr(other, name))
+        self.total_changes += other.total_changes
+        for col, ids in other.gcis_changed_cols.items():
+            self.gcis_changed_cols[col].update(ids)
+        for col, ids in other.cams_changed_cols.items():
+            self.cams_changed_cols[col].update(ids)
+        for name, seconds in other.timings.items():
+            self.timings[name] = self.timings.get(name, 0) + seconds
+
+    def stage(self, name, started):
+        """record how long a stage took, returns the start of the next one"""
+        now = time.perf_counter()
+        self.timings[name] = now - started
+        return now
+
+
+def get_diff_rows(queryset):
+    """id and DIFF_FIELDS of a queryset as dicts, blanks as None"""
+    rows = list(queryset.values("id", *DIFF_FIELDS))
+    for row in rows:
+        for field in BLANK_AS_NULL_FIELDS:
+            if row[field] == "":
+                row[field] = None
+    return rows
+
+
+def get_schedule_rows(term, course_list):
+    """active schedules from GCIS as dicts"""
+    return get_diff_rows(
+        Schedule.objects.filter(
+            course__in=course_list, term=term, is_deleted=False
+        ).order_by("term", "course", "section", "id")
+    )
+
+
+def get_cams_rows(term, course_list):
+    """all schedules from CAMS as dicts"""
+    return get_diff_rows(
+        Cams.live.filter(course__in=course_list, term=term).order_by("id")
+    )
+
+
+def get_deleted_in_gcis(term, course_list):
+    """ids of open schedules deleted in GCIS that still exist in CAMS"""
+    in_cams = Cams.live.filter(
+        term=OuterRef("term"), course=OuterRef("course"), section=OuterRef("section")
+    )
+    return list(
+        Schedule.objects.filter(
+            term=term, course__in=course_list, is_deleted=True, status__in=["OPEN"]
+        )
+        .filter(Exists(in_cams))
+        .order_by("term", "course", "section", "id")
+        .values_list("id", flat=True)
+    )
+
+
+def compare_columns(gcis, cams):
+    """columns that differ between a GCIS and a CAMS schedule"""
+    changed = []
+    if gcis["status"] != cams["status"]:
+        changed.append("status")
+    if gcis["status"] not in ["CANCELED", "CLOSED"]:
+        if gcis["capacity"] != cams["capacity"]:
+            changed.append("capacity")
+        if gcis["instructor_id"] != cams["instructor_id"]:
+            changed.append("instructor")
+        if gcis["campus_id"] != cams["campus_id"]:
+            changed.append("campus")
+        if gcis["location_id"] != cams["location_id"]:
+            changed.append("location")
+        if cams["days"] and gcis["days"] != cams["days"]:
+            changed.append("days")
+        if gcis["start_time"] != cams["start_time"]:
+            changed.append("start_time")
+        if gcis["stop_time"] != cams["stop_time"]:
+            changed.append("stop_time")
+    return changed
+
+
+def classify(diff, gcis_only, cams_only, compare=compare_columns):
+    """sort rows that have no exact match into changed, added and deleted
+
+    gcis_only and cams_only keep the order of the GCIS and CAMS querysets,
+    each row carries its (term_id, course_id, section) as "key". compare
+    returns the changed columns of a GCIS/CAMS pair in the same group.
+    """
+    diff.total_changes = len(gcis_only) + len(cams_only)
+
+    # rows with an empty key part are never grouped, same as pandas groupby
+    grouped = defaultdict(lambda: {"gcis": [], "cams": []})
+    for source, rows in (("gcis", gcis_only), ("cams", cams_only)):
+        for row in rows:
+            if None not in row["key"]:
+                grouped[row["key"]][source].append(row)
+
+    # changed, there could be duplicated sections for one schedule
+    in_changed = set()
+    gcis_changed, cams_changed = set(), set()
+    for group in grouped.values():
+        if len(group["gcis"]) + len(group["cams"]) < 2:
+            continue
+        in_changed.update(id(row) for row in group["gcis"] + group["cams"])
+
+        # if both canceled or closed, these is no need to compare the rest
+        dropped = set()
+        for status in ["CANCELED", "CLOSED"]:
+            same_status = [
+                row
+                for row in group["gcis"] + group["cams"]
+                if row["status"] == status
+            ]
+            if len(same_status) == 2:
+                dropped.update(id(row) for row in same_status)
+
+        gcis_rows = [row for row in group["gcis"] if id(row) not in dropped]
+        cams_rows = [row for row in group["cams"] if id(row) not in dropped]
+        gcis_changed.update(id(row) for row in gcis_rows)
+        cams_changed.update(id(row) for row in cams_rows)
+        for gcis in gcis_rows:
+            for cams in cams_rows:
+                for col in compare(gcis, cams):
+                    diff.gcis_changed_cols[col].add(gcis["id"])
+                    diff.cams_changed_cols[col].add(cams["id"])
+
+    for row in gcis_only:
+        if id(row) in gcis_changed:
+            diff.gcis_changed.append(row["id"])
+        elif id(row) not in in_changed:
+            diff.added.append(row["id"])
+    for row in cams_only:
+        if id(row) in cams_changed:
+            diff.cams_changed.append(row["id"])
+        elif id(row) not in in_changed:
+            diff.deleted_cams.append(row["id"])
+
+
+def diff_python(term, course_list):
+    """hash join GCIS and CAMS on every compared column in one pass"""
+    diff = GcisCamsDiff()
+    started = time.perf_counter()
+
+    gcis_rows = get_schedule_rows(term, course_list)
+    cams_rows = get_cams_rows(term, course_list)
+    started = diff.stage("fetch", started)
+
+    # if both empty, no changes
+    if not gcis_rows and not cams_rows:
+        return diff
+
+    # if gcis is empty, delete all schedules in CAMS
+    if not gcis_rows:
+        diff.deleted_cams = [row["id"] for row in cams_rows]
+        return diff
+
+    gcis_values = [tuple(row[f] for f in DIFF_FIELDS) for row in gcis_rows]
+    cams_values = [tuple(row[f] for f in DIFF_FIELDS) for row in cams_rows]
+    gcis_index, cams_index = set(gcis_values), set(cams_values)
+
+    gcis_only, cams_only = [], []
+    for row, values in zip(gcis_rows, gcis_values):
+        if values not in cams_index:
+            row["key"] = values[:3]
+            gcis_only.append(row)
+    for row, values in zip(cams_rows, cams_values):
+        if values not in gcis_index:
+            row["key"] = values[:3]
+            cams_only.append(row)
+    started = diff.stage("match", started)
+
+    classify(diff, gcis_only, cams_only)
+    started = diff.stage("classify", started)
+
+    diff.deleted_gcis = get_deleted_in_gcis(term, course_list)
+    diff.stage("deleted", started)
+    return diff
+
+
+def diff_pandas(term, course_list):
+    """outer merge GCIS and CAMS data frames on every compared column"""
+    diff = GcisCamsDiff()
+    started = time.perf_counter()
+
+    # get active schedules from GCIS
+    schedules_gcis = pd.DataFrame.from_records(get_schedule_rows(term, course_list))
+    schedules_gcis.rename(columns={"id": "gcis_id"}, inplace=True)
+
+    # get all schedules from CAMS
+    schedules_cams = pd.DataFrame.from_records(get_cams_rows(term, course_list))
+    schedules_cams.rename(columns={"id": "cams_id"}, inplace=True)
+    started = diff.stage("fetch", started)
+
+    # if both empty, no changes
+    if schedules_gcis.empty and schedules_cams.empty:
+        return diff
+
+    # if gcis is empty, delete all schedules in CAMS
+    if schedules_gcis.empty:
+        diff.deleted_cams = [int(_id) for _id in schedules_cams["cams_id"].values]
+        return diff
+
+    # change null to None, replace values where condition is False
+    schedules_gcis = schedules_gcis.where(pd.notnull(schedules_gcis), None)
+    schedules_cams = schedules_cams.where(pd.notnull(schedules_cams), None)
+
+    # make id an int64
+    schedules_gcis["gcis_id"] = schedules_gcis["gcis_id"].astype("Int64")
+    schedules_cams["cams_id"] = schedules_cams["cams_id"].astype("Int64")
+
+    # fix the error casused by N/A in a character column
+    for col in [
+        "term_id",
+        "course_id",
+        "capacity",
+        "instructor_id",
+        "campus_id",
+        "location_id",
+    ]:
+        schedules_cams[col] = schedules_cams[col].astype("Int64")
+        schedules_gcis[col] = schedules_gcis[col].astype("Int64")
+
+    # merge two schedules
+    merged = schedules_gcis.merge(
+        schedules_cams, how="outer", on=list(DIFF_FIELDS), indicator=True,
+    )
+    started = diff.stage("match", started)
+
+    not_in_both = merged.loc[merged["_merge"] != "both"]
+    not_in_both.reset_index(drop=True, inplace=True)
+
+    # change nan to None
+    not_in_both = not_in_both.where(pd.notnull(not_in_both), None)
+
+    # left is GCIS, right is CAMS
+    gcis_only, cams_only = [], []
+    for record in not_in_both.to_dict("records"):
+        record = {k: None if v is pd.NA else v for k, v in record.items()}
+        record["key"] = tuple(record[f] for f in KEY_FIELDS)
+        if record["_merge"] == "left_only":
+            record["id"] = int(record["gcis_id"])
+            gcis_only.append(record)
+        else:
+            record["id"] = int(record["cams_id"])
+            cams_only.append(record)
+
+    classify(diff, gcis_only, cams_only)
+    started = diff.stage("classify", started)
+
+    diff.deleted_gcis = get_deleted_in_gcis(term, course_list)
+    diff.stage("deleted", started)
+    return diff
+
+
+# empty strings are compared as null, like get_diff_rows does
+DIFF_SQL_COLUMNS = ", ".join(
+    f"NULLIF({field}, '') AS {field}" if field in BLANK_AS_NULL_FIELDS else field
+    for field in ("id",) + DIFF_FIELDS
+)
+
+DIFF_SQL = f"""
+WITH gcis AS (
+    SELECT {DIFF_SQL_COLUMNS}
+    FROM scheduling_schedule
+    WHERE term_id = %(term_id)s AND course_id = ANY(%(course_ids)s)
+      AND NOT is_deleted
+),
+cams AS (
+    SELECT {DIFF_SQL_COLUMNS}
+    FROM scheduling_cams
+    WHERE term_id = %(term_id)s AND course_id = ANY(%(course_ids)s)
+      AND load_id IN (SELECT id FROM scheduling_camsload WHERE status = 'live')
+),
+gcis_only AS (
+    SELECT g.*, row_number() OVER (
+        ORDER BY g.term_id, g.course_id, g.section, g.id
+    ) AS position
+    FROM gcis g
+    WHERE NOT EXISTS (
+        SELECT 1 FROM cams c
+        WHERE c.term_id = g.term_id
+          AND c.course_id = g.course_id
+          AND c.section = g.section
+          AND c.capacity IS NOT DISTINCT FROM g.capacity
+          AND c.instructor_id IS NOT DISTINCT FROM g.instructor_id
+          AND c.status IS NOT DISTINCT FROM g.status
+          AND c.campus_id IS NOT DISTINCT FROM g.campus_id
+          AND c.location_id IS NOT DISTINCT FROM g.location_id
+          AND c.days IS NOT DISTINCT FROM g.days
+          AND c.start_time IS NOT DISTINCT FROM g.start_time
+          AND c.stop_time IS NOT DISTINCT FROM g.stop_time
+    )
+),
+cams_only AS (
+    SELECT c.*, row_number() OVER (ORDER BY c.id) AS position
+    FROM cams c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM gcis g
+        WHERE g.term_id = c.term_id
+          AND g.course_id = c.course_id
+          AND g.section = c.section
+          AND g.capacity IS NOT DISTINCT FROM c.capacity
+          AND g.instructor_id IS NOT DISTINCT FROM c.instructor_id
+          AND g.status IS NOT DISTINCT FROM c.status
+          AND g.campus_id IS NOT DISTINCT FROM c.campus_id
+          AND g.location_id IS NOT DISTINCT FROM c.location_id
+          AND g.days IS NOT DISTINCT FROM c.days
+          AND g.start_time IS NOT DISTINCT FROM c.start_time
+          AND g.stop_time IS NOT DISTINCT FROM c.stop_time
+    )
+)
+SELECT
+    EXISTS (SELECT 1 FROM gcis) AS has_gcis,
+    g.id, g.position, g.term_id, g.course_id, g.section, g.status,
+    c.id, c.position, c.term_id, c.course_id, c.section, c.status,
+    g.status IS DISTINCT FROM c.status,
+    g.capacity IS DISTINCT FROM c.capacity,
+    g.instructor_id IS DISTINCT FROM c.instructor_id,
+    g.campus_id IS DISTINCT FROM c.campus_id,
+    g.location_id IS DISTINCT FROM c.location_id,
+    c.days IS NOT NULL AND g.days IS DISTINCT FROM c.days,
+    g.start_time IS DISTINCT FROM c.start_time,
+    g.stop_time IS DISTINCT FROM c.stop_time
+FROM gcis_only g
+FULL OUTER JOIN cams_only c
+    ON c.term_id = g.term_id
+    AND c.course_id = g.course_id
+    AND c.section = g.section
+"""
+
+# per-column change flags returned by DIFF_SQL, in order
+SQL_FLAG_COLUMNS = (
+    "status",
+    "capacity",
+    "instructor",
+    "campus",
+    "location",
+    "days",
+    "start_time",
+    "stop_time",
+)
+
+
+def diff_sql(term, course_list):
+    """full outer join GCIS and CAMS in PostgreSQL, only differing rows come back"""
+    if connection.vendor != "postgresql":
+        raise ImproperlyConfigured("the sql diff engine requires PostgreSQL")
+
+    diff = GcisCamsDiff()
+    started = time.perf_counter()
+
+    course_ids = list(course_list.values_list("id", flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute(DIFF_SQL, {"term_id": term.pk, "course_ids": course_ids})
+        records = cursor.fetchall()
+    started = diff.stage("query", started)
+
+    gcis_rows, cams_rows, flags = {}, {}, {}
+    has_gcis = True
+    for record in records:
+        has_gcis = record[0]
+        gcis_id, cams_id = record[1], record[7]
+        if gcis_id is not None:
+            gcis_rows[gcis_id] = {
+                "id": gcis_id,
+                "position": record[2],
+                "key": tuple(record[3:6]),
+                "status": record[6],
+            }
+        if cams_id is not None:
+            cams_rows[cams_id] = {
+                "id": cams_id,
+                "position": record[8],
+                "key": tuple(record[9:12]),
+                "status": record[12],
+            }
+        if gcis_id is not None and cams_id is not None:
+            flags[(gcis_id, cams_id)] = record[13:]
+
+    # if gcis is empty, delete all schedules in CAMS
+    if not has_gcis:
+        diff.deleted_cams = sorted(cams_rows, key=lambda _id: cams_rows[_id]["position"])
+        return diff
+
+    def compare(gcis, cams):
+        status_changed, *other_changed = flags[(gcis["id"], cams["id"])]
+        changed = ["status"] if status_changed else []
+        if gcis["status"] not in ["CANCELED", "CLOSED"]:
+            changed += [
+                col
+                for col, is_changed in zip(SQL_FLAG_COLUMNS[1:], other_changed)
+                if is_changed
+            ]
+        return changed
+
+    gcis_only = sorted(gcis_rows.values(), key=lambda row: row["position"])
+    cams_only = sorted(cams_rows.values(), key=lambda row: row["position"])
+    classify(diff, gcis_only, cams_only, compare)
+    started = diff.stage("classify", started)
+
+    diff.deleted_gcis = get_deleted_in_gcis(term, course_list)
+    diff.stage("deleted", started)
+    return diff
+
+
+ENGINES = {
+    "python": diff_python,
+    "pandas": diff_pandas,
+    "sql": diff_sql,
+}
+
+
+def get_diff_engine():
+    """GCIS_CAMS_DIFF_ENGINE, checked against ENGINES and the database"""
+    engine = settings.GCIS_CAMS_DIFF_ENGINE
+    if engine not in ENGINES:
+        raise ImproperlyConfigured(
+            f"GCIS_CAMS_DIFF_ENGINE must be one of {', '.join(ENGINES)}, not {engine!r}"
+        )
+    if engine == "sql" and connection.vendor != "postgresql":
+        raise ImproperlyConfigured('GCIS_CAMS_DIFF_ENGINE = "sql" requires PostgreSQL')
+    return engine
+
+
+def diff_gcis_cams(term, course_list, engine=None):
+    """run a diff engine and log how long each stage took"""
+    if not term or not course_list:
+        return GcisCamsDiff()
+
+    engine = engine or get_diff_engine()
+
+    diff = ENGINES[engine](term, course_list)
+    logger.debug(
+        "gcis/cams diff for %s (%s): %s",
+        term,
+        engine,
+        ", ".join(f"{name}={sec * 1000:.1f}ms" for name, sec in diff.timings.items()),
+    )
+    return diff
+
+
+def get_change_summary(term, subjects):
+    """changes for the subjects of a term, assembled from per-subject diffs
+
+    A subject's diff does not depend on the other subjects of a profile, so
+    every coordinator sharing a subject reads the same ChangeSummarySnapshot.
+    Subjects are combined in the order they are given, as in the profile.
+    """
+    diff = GcisCamsDiff()
+    subjects = list(
+        dict.fromkeys(
+            subject.strip().upper() for subject in subjects if subject.strip()
+        )
+    )
+    if not term or not subjects:
+        return diff
+
+    snapshots = {
+        snapshot.subject: snapshot
+        for snapshot in ChangeSummarySnapshot.objects.filter(
+            term=term, subject__in=subjects, is_stale=False
+        )
+    }
+    for subject in subjects:
+        if subject in snapshots:
+            diff.extend(GcisCamsDiff.from_dict(snapshots[subject].diff))
+        else:
+            diff.extend(get_subject_diff(term, subject))
+    return diff
+
+
+def get_subject_diff(term, subject):
+    """diff of one subject, rebuilt only if its snapshot is missing or stale"""
+    return GcisCamsDiff.from_dict(
+        ChangeSummarySnapshot.get_or_rebuild(
+            lambda: diff_gcis_cams(term, Course.objects.filter(subject=subject)).to_dict(),
+            term=term,
+            subject=subject,
+        )
+    )
+
+
+def hydrate(manager, ids):
+    """load rows for ids with one query, keeping the order of ids
+
+    Rows deleted since the ids were collected are left out.
+    """
+    ids = [int(_id) for _id in ids]
+    if not ids:
+        return []
+    rows = manager.with_related().in_bulk(ids)
+    return [rows[_id] for _id in ids if _id in rows]
+
+
+def iter_hydrate(manager, ids, chunk_size=500):
+    """like hydrate, but loads and yields chunk_size rows at a time"""
+    for start in range(0, len(ids), chunk_size):
+        yield from hydrate(manager, ids[start:start + chunk_size])
+
+
+def hydrate_diff(diff):
+    """model instances for the changed, added and deleted ids of a diff"""
+    gcis_changed = hydrate(Schedule.objects, diff.gcis_changed)
+    cams_changed = hydrate(Cams.live, diff.cams_changed)
+    added = hydrate(Schedule.objects, diff.added)
+    deleted = hydrate(Schedule.objects, diff.deleted_gcis)
+    deleted += hydrate(Cams.live, diff.deleted_cams)
+    return gcis_changed, cams_changed, added, deleted
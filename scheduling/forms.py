@@ -1,7 +1,9 @@
 from django import forms
+from django.db.models import Q
 from django.forms import ValidationError
 
-from .models import Course, Schedule, Instructor, Campus, Location
+from .models import Course, Schedule, Instructor, Campus, Location, Term
+from .timetable import TIMETABLE_FIELDS, Timetable
 from main.models import Profile
 
 SUBJECTS = [
@@ -395,8 +397,13 @@ class ScheduleForm(forms.ModelForm):
             ),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, source_pk=None, check_conflicts=True, **kwargs):
         super(ScheduleForm, self).__init__(*args, **kwargs)
+        # warnings about sections double-booking the instructor or room, see clean;
+        # a duplicate does not conflict with the section it was copied from
+        self.conflicts = []
+        self.source_pk = source_pk
+        self.check_conflicts = check_conflicts
         for field_name, field in self.fields.items():
             if field.widget.attrs.get("class"):
                 field.widget.attrs["class"] += " form-control"
@@ -440,8 +447,57 @@ class ScheduleForm(forms.ModelForm):
             self.add_error("start_time", "Invalid start time.")
             self.add_error("stop_time", "Invalid stop time.")
 
+        if self.check_conflicts and not self.errors:
+            self.conflicts = self.find_conflicts(cleaned_data)
+
         return cleaned_data
 
+    def find_conflicts(self, data):
+        """warnings for the sections of the term overlapping the instructor or room
+
+        One query for the term's sections of the instructor and room meeting
+        on days between start and stop, a Timetable of them tells which
+        resource each one conflicts on.
+        """
+        days, start, stop = data["days"], data["start_time"], data["stop_time"]
+        if not (data["term"] and days and start and stop):
+            return []
+        instructor = data["instructor"]
+        location = None if "NT" in data["section"] else data["location"]
+
+        resources = Q()
+        if instructor:
+            resources |= Q(instructor=instructor)
+        if location:
+            resources |= Q(location=location)
+        if not resources:
+            return []
+
+        candidates = (
+            Schedule.objects.meeting(days, start, stop)
+            .filter(resources, term=data["term"], is_deleted=False)
+            .select_related("course")
+        )
+        excluded = [pk for pk in (self.instance.pk, self.source_pk) if pk]
+        if excluded:
+            candidates = candidates.exclude(pk__in=excluded)
+        sections = {s.pk: s for s in candidates}
+        timetable = Timetable(
+            [{f: getattr(s, f) for f in TIMETABLE_FIELDS} for s in sections.values()]
+        )
+
+        conflicts = []
+        for resource, obj in [("instructor", instructor), ("location", location)]:
+            if not obj:
+                continue
+            for pk in sorted(timetable.conflicts(resource, obj.pk, days, start, stop)):
+                s = sections[pk]
+                conflicts.append(
+                    f"{obj} is also scheduled for {s} on {s.days} "
+                    f"{s.start_time:%I:%M %p}-{s.stop_time:%I:%M %p}."
+                )
+        return conflicts
+
     def save(self, commit=True):
         schedule = super(ScheduleForm, self).save(commit=False)
 
@@ -450,6 +506,53 @@ class ScheduleForm(forms.ModelForm):
         return schedule
 
 
+class TimeWindowForm(forms.Form):
+    """days and a time window of a term, see FreeRoomForm and SearchByTimeForm"""
+
+    term = forms.ModelChoiceField(queryset=Term.objects.all())
+    days = forms.MultipleChoiceField(
+        choices=ScheduleForm.DAYS_CHOICES,
+        widget=forms.CheckboxSelectMultiple(attrs={"display": "inline-block"}),
+    )
+    start_time = forms.TimeField(
+        label="Start",
+        widget=forms.TimeInput(attrs={"class": "timepicker", "placeholder": "8:00 AM"}),
+    )
+    stop_time = forms.TimeField(
+        label="Stop",
+        widget=forms.TimeInput(attrs={"class": "timepicker", "placeholder": "10:00 PM"}),
+    )
+    campus = forms.ModelChoiceField(queryset=Campus.objects.all(), required=False)
+
+    def __init__(self, *args, **kwargs):
+        super(TimeWindowForm, self).__init__(*args, **kwargs)
+        for field_name, field in self.fields.items():
+            if field.widget.attrs.get("class"):
+                field.widget.attrs["class"] += " form-control"
+            else:
+                if field_name == "days":
+                    field.widget.attrs["class"] = ""
+                else:
+                    field.widget.attrs["class"] = "form-control"
+
+    def clean_days(self):
+        return "".join(self.cleaned_data.get("days"))
+
+    def clean(self):
+        cleaned_data = super(TimeWindowForm, self).clean()
+        start_time = cleaned_data.get("start_time")
+        stop_time = cleaned_data.get("stop_time")
+        if start_time and stop_time and start_time >= stop_time:
+            self.add_error("stop_time", "Invalid stop time.")
+        return cleaned_data
+
+
+class FreeRoomForm(TimeWindowForm):
+
+    building = forms.CharField(max_length=10, required=False)
+    capacity = forms.IntegerField(min_value=1, required=False)
+
+
 class InstructorForm(forms.ModelForm):
     class Meta:
         model = Instructor
@@ -532,3 +635,20 @@ class SearchBySubjectForm(forms.ModelForm):
                 field.widget.attrs["class"] += " form-control"
             else:
                 field.widget.attrs["class"] = "form-control"
+
+
+class SearchByTimeForm(TimeWindowForm):
+    def __init__(self, *args, **kwargs):
+        super(SearchByTimeForm, self).__init__(*args, **kwargs)
+        self.fields["days"].required = False
+        self.fields["start_time"].label = "From"
+        self.fields["start_time"].widget.attrs["placeholder"] = "5:00 PM"
+        self.fields["stop_time"].label = "To"
+        self.fields["term"].widget.attrs["id"] = "id_term_t"
+        self.fields["campus"].widget.attrs["id"] = "id_campus_t"
+
+    def clean_days(self):
+        # no days is every day
+        return super(SearchByTimeForm, self).clean_days() or "".join(
+            day for day, _ in ScheduleForm.DAYS_CHOICES
+        )
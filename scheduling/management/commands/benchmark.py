@@ -0,0 +1,227 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from scheduling.diff import ENGINES
+from scheduling.models import (
+    Course,
+    Dates,
+    Term,
+    invalidate_change_summary,
+    invalidate_schedule_summary,
+)
+from scheduling.views import get_diff_gcis_cams
+
+# generate_college layout, sections per course follow from the size
+SUBJECTS = 20
+COURSES_PER_SUBJECT = 10
+
+
+class QueryCounter:
+    """counts queries and their time, unlike connection.queries it is not capped at 9000"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the change summary, schedule summary and search pages on "
+        "generated data in a throw-away test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 10000, 100000],
+            help="number of sections per run",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="bench_output.json")
+        parser.add_argument("--compare", help="earlier output file to compare against")
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = []
+            for size in options["sizes"]:
+                self.stdout.write(f"Seeding {size} sections...")
+                self.seed(size, options["seed"])
+                for name, run, setup in self.cases():
+                    result = self.measure(run, setup)
+                    result.update(size=size, name=name)
+                    results.append(result)
+                    self.stdout.write(
+                        f"  {name:<40} {result['wall_ms']:>9.1f} ms "
+                        f"{result['queries']:>5} queries {result['sql_ms']:>9.1f} ms sql "
+                        f"{result['peak_kib']:>9.0f} KiB"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": self.repeat,
+            "results": results,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def seed(self, size, seed):
+        sections_per_course = max(1, size // (SUBJECTS * COURSES_PER_SUBJECT))
+        call_command(
+            "generate_college",
+            subjects=SUBJECTS,
+            courses_per_subject=COURSES_PER_SUBJECT,
+            sections_per_course=sections_per_course,
+            seed=seed,
+            clear=True,
+            stdout=self.stdout,
+        )
+        self.term = Term.objects.get(year=2023, semester="FALL")
+        self.subjects = sorted(Course.objects.values_list("subject", flat=True).distinct())
+
+        if not Dates.objects.exists():
+            Dates.objects.create(cams_update_at=timezone.now())
+        user, _ = User.objects.get_or_create(username="benchmark")
+        user.profile.subjects = ",".join(self.subjects)
+        user.profile.save()
+        self.client = Client()
+        self.client.force_login(user)
+
+    def cases(self):
+        """(name, run, setup) for every measured code path"""
+        term_name = f"{self.term.semester}{self.term.year}"
+        course_list = Course.objects.filter(subject__in=self.subjects)
+
+        def invalidate():
+            invalidate_change_summary(self.term.pk)
+
+        def invalidate_summary():
+            invalidate_schedule_summary([self.term.pk])
+
+        def get(url):
+            def run():
+                response = self.client.get(url)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                assert response.status_code == 200, (url, response.status_code)
+            return run
+
+        def diff(engine):
+            return lambda: get_diff_gcis_cams(self.term, course_list, engine)
+
+        cases = [
+            (f"get_diff_gcis_cams[{engine}]", diff(engine), None)
+            for engine in ENGINES
+            if engine != "sql" or connection.vendor == "postgresql"
+        ]
+        change_summary = reverse("change_summary_by_term", args=[term_name])
+        download = reverse("download_change_summary_by_term", args=[term_name])
+        schedule_summary = reverse("schedule_summary_by_term", args=[term_name])
+        cases += [
+            ("change_summary_by_term (cold)", get(change_summary), invalidate),
+            ("change_summary_by_term (warm)", get(change_summary), None),
+            ("download_change_summary_by_term (cold)", get(download), invalidate),
+            ("download_change_summary_by_term (warm)", get(download), None),
+            ("schedule_summary_by_term (cold)", get(schedule_summary), invalidate_summary),
+            ("schedule_summary_by_term (warm)", get(schedule_summary), None),
+            (
+                "search (subject)",
+                get(f"{reverse('search')}?term={self.term.pk}&subject={self.subjects[0]}"),
+                None,
+            ),
+        ]
+        return cases
+
+    def measure(self, run, setup):
+        """median wall time, queries and sql time of a case, peak memory of one more run"""
+        wall, queries, sql = [], [], []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                run()
+                wall.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.queries)
+            sql.append(counter.seconds * 1000)
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "wall_ms": statistics.median(wall),
+            "wall_ms_min": min(wall),
+            "queries": max(queries),
+            "sql_ms": statistics.median(sql),
+            "peak_kib": peak / 1024,
+        }
+
+    def compare(self, path, results):
+        with open(path) as f:
+            previous = {
+                (r["size"], r["name"]): r for r in json.load(f)["results"]
+            }
+        self.stdout.write(f"Compared with {path}:")
+        for result in results:
+            before = previous.get((result["size"], result["name"]))
+            if not before:
+                continue
+            self.stdout.write(
+                f"  {result['size']:>7} {result['name']:<40} "
+                f"wall {self.change(before['wall_ms'], result['wall_ms'])} "
+                f"queries {before['queries']} -> {result['queries']} "
+                f"memory {self.change(before['peak_kib'], result['peak_kib'])}"
+            )
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return "n/a"
+        return f"{(after - before) / before * 100:+.0f}%"
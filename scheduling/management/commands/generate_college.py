@@ -0,0 +1,330 @@
+import random
+from datetime import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from scheduling.forms import SUBJECTS
+from scheduling.models import (
+    CAMS_FINGERPRINT_FIELDS,
+    MEETING_PATTERN_FIELDS,
+    Campus,
+    Cams,
+    CamsLoad,
+    Course,
+    Instructor,
+    Location,
+    Schedule,
+    Term,
+    delete_without_signals,
+    get_cams_fingerprint,
+    get_live_cams_load,
+    get_meeting_pattern,
+    invalidate_change_summary,
+    invalidate_room_occupancy,
+    invalidate_schedule_summary,
+)
+
+SEMESTERS = ["FALL", "SPRING", "SUMMER"]
+
+FIRST_NAMES = [
+    "Alex", "Bailey", "Casey", "Dana", "Elliot", "Frankie", "Gale", "Harper",
+    "Jamie", "Jordan", "Kelly", "Logan", "Morgan", "Parker", "Quinn", "Riley",
+    "Rowan", "Sage", "Taylor", "Val",
+]
+LAST_NAMES = [
+    "Adams", "Brown", "Clark", "Davis", "Evans", "Flores", "Garcia", "Hill",
+    "Jones", "King", "Lee", "Lopez", "Miller", "Nguyen", "Ortiz", "Perez",
+    "Reed", "Smith", "Turner", "Walker", "Young",
+]
+BUILDINGS = ["LIB", "SCI", "HSC", "CTE", "FA", "ADM", "SOU"]
+CAMPUSES = ["Main", "South", "High School"]
+
+# days with minutes per meeting
+MEETING_PATTERNS = [("MWF", 50), ("MW", 75), ("TR", 75), ("M", 170), ("T", 170), ("R", 170)]
+START_TIMES = [time(h, m) for h in range(8, 20) for m in (0, 30)]
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic college with GCIS and CAMS schedules for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--terms", type=int, default=1, help="number of terms")
+        parser.add_argument("--subjects", type=int, default=20, help="number of subjects")
+        parser.add_argument("--courses-per-subject", type=int, default=10)
+        parser.add_argument("--sections-per-course", type=int, default=5)
+        parser.add_argument("--instructors", type=int, default=300)
+        parser.add_argument("--rooms", type=int, default=150)
+        parser.add_argument(
+            "--drift",
+            type=float,
+            default=0.05,
+            help="share of sections that differ between GCIS and CAMS, "
+            "split evenly into changed, added and deleted",
+        )
+        parser.add_argument(
+            "--soft-delete-rate",
+            type=float,
+            default=0.02,
+            help="share of GCIS sections marked as deleted",
+        )
+        parser.add_argument("--year", type=int, default=2023, help="year of the first term")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="remove existing GCIS and CAMS schedules of the generated terms first, "
+            "required if the terms have any",
+        )
+
+    def handle(self, *args, **options):
+        # sections are numbered A01 to Z99
+        if options["sections_per_course"] > 2599:
+            raise CommandError("At most 2599 sections per course are supported.")
+        if options["subjects"] > len(SUBJECTS):
+            raise CommandError(f"There are only {len(SUBJECTS)} subjects.")
+        if not 0 <= options["drift"] <= 1 or not 0 <= options["soft_delete_rate"] <= 1:
+            raise CommandError("--drift and --soft-delete-rate must be between 0 and 1.")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            terms = self.get_terms(options["terms"], options["year"])
+            if options["clear"]:
+                # the snapshots of the terms are invalidated below
+                delete_without_signals(Schedule.objects.filter(term__in=terms))
+                delete_without_signals(Cams.objects.filter(term__in=terms))
+                CamsLoad.objects.filter(term__in=terms).delete()
+            else:
+                # generating a term again would duplicate its sections
+                used = set()
+                for model in (Schedule, Cams):
+                    used.update(
+                        model.objects.filter(term__in=terms).values_list("term", flat=True)
+                    )
+                if used:
+                    raise CommandError(
+                        ", ".join(str(term) for term in terms if term.pk in used)
+                        + " already have sections, use --clear to replace them."
+                    )
+
+            courses = self.get_courses(options["subjects"], options["courses_per_subject"])
+            self.instructors = self.get_instructors(options["instructors"])
+            self.rooms = self.get_rooms(options["rooms"])
+            self.campuses = [
+                Campus.objects.get_or_create(name=name)[0] for name in CAMPUSES
+            ]
+            self.internet = Campus.objects.get_or_create(name="Internet")[0]
+            self.internet_room = Location.objects.get_or_create(
+                building="Inter", room="net"
+            )[0]
+
+            counts = {"gcis": 0, "cams": 0}
+            for term in terms:
+                load = get_live_cams_load(term.pk)
+                for gcis, cams in self.generate_term(
+                    term,
+                    courses,
+                    options["sections_per_course"],
+                    options["drift"],
+                    options["soft_delete_rate"],
+                ):
+                    # bulk_create skips the pre_save receivers that set these
+                    for c in cams:
+                        c.load = load
+                        c.fingerprint = get_cams_fingerprint(
+                            getattr(c, field) for field in CAMS_FINGERPRINT_FIELDS
+                        )
+                    for row in gcis + cams:
+                        values = get_meeting_pattern(
+                            row.section, row.days, row.start_time, row.stop_time
+                        )
+                        for field, value in zip(MEETING_PATTERN_FIELDS, values):
+                            setattr(row, field, value)
+                    Schedule.objects.bulk_create(gcis, batch_size=self.batch_size)
+                    Cams.objects.bulk_create(cams, batch_size=self.batch_size)
+                    counts["gcis"] += len(gcis)
+                    counts["cams"] += len(cams)
+                invalidate_change_summary(term.pk)
+            invalidate_room_occupancy([term.pk for term in terms])
+            invalidate_schedule_summary([term.pk for term in terms])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {counts['gcis']} GCIS and {counts['cams']} CAMS sections "
+                f"in {len(terms)} term(s), {len(courses)} courses."
+            )
+        )
+
+    def get_terms(self, number_of_terms, year):
+        terms = []
+        for n in range(number_of_terms):
+            semester = SEMESTERS[n % len(SEMESTERS)]
+            # spring and summer belong to the academic year after a fall term
+            term_year = year + (n + 2) // len(SEMESTERS)
+            term, _ = Term.objects.get_or_create(
+                year=term_year, semester=semester, defaults={"active": "T"}
+            )
+            terms.append(term)
+        return terms
+
+    def get_courses(self, number_of_subjects, courses_per_subject):
+        subjects = sorted(self.rng.sample(SUBJECTS, number_of_subjects))
+        wanted = [
+            (subject, str(1301 + n))
+            for subject in subjects
+            for n in range(courses_per_subject)
+        ]
+        existing = {
+            (c.subject, c.number): c
+            for c in Course.objects.filter(subject__in=subjects)
+        }
+        Course.objects.bulk_create(
+            [
+                Course(
+                    subject=subject,
+                    number=number,
+                    # the second digit of a course number is its credit hours
+                    credit=int(number[1]),
+                    name=f"{subject} {number}",
+                )
+                for subject, number in wanted
+                if (subject, number) not in existing
+            ],
+            batch_size=self.batch_size,
+        )
+        existing = {
+            (c.subject, c.number): c
+            for c in Course.objects.filter(subject__in=subjects)
+        }
+        return [existing[key] for key in wanted]
+
+    def get_instructors(self, number_of_instructors):
+        wanted = [
+            (
+                FIRST_NAMES[n % len(FIRST_NAMES)],
+                f"{LAST_NAMES[n // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+                f"{'' if n < len(FIRST_NAMES) * len(LAST_NAMES) else n}",
+            )
+            for n in range(number_of_instructors)
+        ]
+        existing = {
+            (i.first_name, i.last_name): i for i in Instructor.objects.all()
+        }
+        Instructor.objects.bulk_create(
+            [
+                Instructor(first_name=first, last_name=last)
+                for first, last in wanted
+                if (first, last) not in existing
+            ],
+            batch_size=self.batch_size,
+        )
+        existing = {
+            (i.first_name, i.last_name): i for i in Instructor.objects.all()
+        }
+        return [existing[key] for key in wanted]
+
+    def get_rooms(self, number_of_rooms):
+        wanted = [
+            (BUILDINGS[n % len(BUILDINGS)], str(100 + n // len(BUILDINGS)))
+            for n in range(number_of_rooms)
+        ]
+        existing = {(l.building, l.room): l for l in Location.objects.all()}
+        Location.objects.bulk_create(
+            [
+                Location(building=building, room=room)
+                for building, room in wanted
+                if (building, room) not in existing
+            ],
+            batch_size=self.batch_size,
+        )
+        existing = {(l.building, l.room): l for l in Location.objects.all()}
+        return [existing[key] for key in wanted]
+
+    def random_section(self, term, course, section):
+        """field values of one section"""
+        rng = self.rng
+        values = {
+            "term": term,
+            "course": course,
+            "section": section,
+            "capacity": rng.choice([16, 20, 24, 30, 35, 40]),
+            "instructor": rng.choice(self.instructors) if rng.random() > 0.03 else None,
+            "status": rng.choices(["OPEN", "CLOSED", "CANCELED"], [90, 5, 5])[0],
+        }
+        if "NT" in section:
+            values.update(
+                campus=self.internet, location=self.internet_room,
+                days=None, start_time=None, stop_time=None,
+            )
+        else:
+            days, minutes = rng.choice(MEETING_PATTERNS)
+            start = rng.choice(START_TIMES)
+            stop_minutes = min(start.hour * 60 + start.minute + minutes, 22 * 60)
+            values.update(
+                campus=rng.choice(self.campuses),
+                location=rng.choice(self.rooms),
+                days=days,
+                start_time=start,
+                stop_time=time(stop_minutes // 60, stop_minutes % 60),
+            )
+        return values
+
+    def drift(self, values):
+        """change one or two fields the way CAMS usually differs"""
+        rng = self.rng
+        changed = dict(values)
+        fields = ["capacity", "instructor", "status", "location", "start_time"]
+        for field in rng.sample(fields, rng.randint(1, 2)):
+            if field == "capacity":
+                changed["capacity"] = values["capacity"] + rng.choice([-5, 5, 10])
+            elif field == "instructor":
+                changed["instructor"] = rng.choice(self.instructors)
+            elif field == "status":
+                changed["status"] = rng.choice(["OPEN", "CLOSED", "CANCELED"])
+            elif field == "location" and values["days"]:
+                changed["location"] = rng.choice(self.rooms)
+            elif field == "start_time" and values["days"]:
+                changed["start_time"] = rng.choice(START_TIMES)
+        return changed
+
+    def generate_term(self, term, courses, sections_per_course, drift, soft_delete_rate):
+        """yield batches of (GCIS schedules, CAMS schedules) for a term"""
+        rng = self.rng
+        deleted_at = timezone.now()
+        gcis, cams = [], []
+        for course in courses:
+            for n in range(1, sections_per_course + 1):
+                suffix = rng.choices(["", "NT", "HY"], [70, 20, 10])[0]
+                section = f"{chr(ord('A') + n // 100)}{n % 100:02d}{suffix}"
+                values = self.random_section(term, course, section)
+
+                schedule = None
+                roll = rng.random()
+                if roll < drift / 3:
+                    # added in GCIS, not in CAMS yet
+                    schedule = Schedule(**values)
+                elif roll < drift * 2 / 3:
+                    # deleted from GCIS, still in CAMS
+                    cams.append(Cams(**values))
+                elif roll < drift:
+                    schedule = Schedule(**self.drift(values))
+                    cams.append(Cams(**values))
+                else:
+                    schedule = Schedule(**values)
+                    cams.append(Cams(**values))
+
+                if schedule:
+                    if rng.random() < soft_delete_rate:
+                        schedule.is_deleted = True
+                        schedule.deleted_at = deleted_at
+                    gcis.append(schedule)
+
+            if len(gcis) >= self.batch_size:
+                yield gcis, cams
+                gcis, cams = [], []
+        if gcis or cams:
+            yield gcis, cams
@@ -0,0 +1,144 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from scheduling.cams import (
+    CAMS_CSV_COLUMNS,
+    CamsLoader,
+    CamsLoadError,
+    load_cams_parallel,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the CAMS schedules of every term in a CAMS extract. "
+        f"The extract is a CSV file with the columns {', '.join(CAMS_CSV_COLUMNS)}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CAMS extract (CSV)")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="only insert, update and delete the sections that changed",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="load the terms of the extract in this many processes, "
+            "each term in its own transaction (PostgreSQL only)",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--max-rejects",
+            type=int,
+            default=0,
+            help="load anyway when at most this many rows are invalid, "
+            "per term with --workers",
+        )
+        parser.add_argument("--rejects", help="write rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        self.rejects = None
+        rejects_file = None
+        if options["rejects"]:
+            rejects_file = open(options["rejects"], "w", newline="")
+            self.rejects = csv.writer(rejects_file)
+            self.rejects.writerow(["Line", "Error"] + CAMS_CSV_COLUMNS)
+
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stderr.write("SQLite allows one writer at a time, loading serially.")
+            workers = 1
+
+        try:
+            if workers > 1:
+                loaded = self.load_parallel(options, workers)
+            else:
+                loaded = self.load(options)
+        except OSError as e:
+            raise CommandError(e)
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {loaded} CAMS sections in {time.perf_counter() - started:.1f}s."
+            )
+        )
+
+    def load(self, options):
+        loader = CamsLoader(
+            options["incremental"], options["batch_size"], options["max_rejects"]
+        )
+
+        def progress(lines, rejected):
+            self.stdout.write(f"{lines} rows read, {rejected} rejected")
+
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as f:
+                counts = loader.load(f, progress, self.reject)
+        except CamsLoadError as e:
+            raise CommandError(e)
+
+        for term, term_counts in counts.items():
+            self.write_counts(term, term_counts)
+        self.write_resolver(loader.resolver.report())
+        return loader.lines - loader.rejected
+
+    def load_parallel(self, options, workers):
+        results, rejected = load_cams_parallel(
+            options["path"],
+            workers,
+            options["incremental"],
+            options["batch_size"],
+            options["max_rejects"],
+        )
+        for line, row, error in rejected:
+            self.reject(line, row, error)
+        if not results:
+            raise CommandError(f"{len(rejected)} invalid row(s), nothing loaded")
+
+        loaded, failed = 0, []
+        for result in results:
+            for line, row, error in result["rejected"]:
+                self.reject(line, row, error)
+            if result["error"]:
+                failed.append(result["term"])
+                self.stderr.write(f"{result['term']}: {result['error']}")
+                continue
+            loaded += result["lines"] - len(result["rejected"])
+            self.write_counts(result["term"], result["counts"], result["seconds"])
+            self.write_resolver(result["resolver"], indent="  ")
+
+        if failed:
+            raise CommandError(
+                f"{', '.join(failed)} not loaded, the other terms were loaded."
+            )
+        return loaded
+
+    def reject(self, line, row, error):
+        self.stderr.write(f"line {line}: {error}")
+        if self.rejects:
+            self.rejects.writerow([line, error] + [row.get(c) for c in CAMS_CSV_COLUMNS])
+
+    def write_counts(self, term, counts, seconds=None):
+        self.stdout.write(
+            f"{term}: "
+            + ", ".join(f"{count} {action}" for action, count in counts.items())
+            + ("" if seconds is None else f" in {seconds:.1f}s")
+        )
+
+    def write_resolver(self, report, indent=""):
+        for table, stats in report.items():
+            self.stdout.write(
+                f"{indent}{table}: "
+                + ", ".join(f"{count} {counter}" for counter, count in stats.items())
+            )
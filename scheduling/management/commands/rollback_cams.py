@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.cams import parse_term, rollback_cams_load
+from scheduling.models import Term
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the previous CAMS load of terms live again. "
+        "Rolling back twice returns to the current load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("terms", nargs="+", help="terms like FALL2023")
+
+    def handle(self, *args, **options):
+        for value in options["terms"]:
+            try:
+                semester, year = parse_term(value)
+                term = Term.objects.get(semester=semester, year=year)
+            except (ValueError, Term.DoesNotExist):
+                raise CommandError(f"Unknown term {value}.")
+
+            if rollback_cams_load(term):
+                self.stdout.write(self.style.SUCCESS(f"{term}: previous CAMS load is live."))
+            else:
+                self.stderr.write(f"{term}: no previous CAMS load.")
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:26
+
+import hashlib
+
+from django.db import migrations, models
+
+# scheduling.models.CAMS_FINGERPRINT_FIELDS and get_cams_fingerprint as of
+# this migration
+FINGERPRINT_FIELDS = [
+    "capacity",
+    "instructor_id",
+    "status",
+    "campus_id",
+    "location_id",
+    "days",
+    "start_time",
+    "stop_time",
+]
+
+
+def get_fingerprint(values):
+    content = "\x1f".join("\\N" if value is None else str(value) for value in values)
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def set_fingerprints(apps, schema_editor):
+    """fingerprint the existing CAMS rows, the first incremental load would
+    rewrite every one of them otherwise"""
+    Cams = apps.get_model("scheduling", "Cams")
+    batch = []
+    for row in Cams.objects.only(*FINGERPRINT_FIELDS).iterator(chunk_size=5000):
+        row.fingerprint = get_fingerprint(getattr(row, field) for field in FINGERPRINT_FIELDS)
+        batch.append(row)
+        if len(batch) == 5000:
+            Cams.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    Cams.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0017_changesummarysnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cams',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(set_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def create_live_loads(apps, schema_editor):
+    """existing CAMS rows become the live load of their term
+
+    Rows without a term, e.g. of a deleted term, get a live load without a
+    term, the one get_live_cams_load(None) returns for them later.
+    """
+    Cams = apps.get_model("scheduling", "Cams")
+    CamsLoad = apps.get_model("scheduling", "CamsLoad")
+    for term_id in Cams.objects.values_list("term_id", flat=True).distinct():
+        load = CamsLoad.objects.create(
+            term_id=term_id, status="live", activated_at=timezone.now()
+        )
+        if term_id is None:
+            rows = Cams.objects.filter(term__isnull=True)
+        else:
+            rows = Cams.objects.filter(term_id=term_id)
+        rows.update(load=load)
+    if Cams.objects.filter(load__isnull=True).exists():
+        raise RuntimeError("CAMS rows without a load would be hidden")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0018_cams_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CamsLoad',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('loading', 'Loading'), ('live', 'Live'), ('retired', 'Retired')], default='loading', max_length=7)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('term', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='scheduling.term')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cams',
+            name='load',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='scheduling.camsload'),
+        ),
+        migrations.RunPython(create_live_loads, migrations.RunPython.noop),
+    ]
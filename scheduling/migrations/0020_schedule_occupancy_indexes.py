@@ -0,0 +1,21 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0019_camsload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['term', 'instructor'], name='scheduling__term_id_37e5fc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['term', 'location'], name='scheduling__term_id_f2d935_idx'),
+        ),
+    ]
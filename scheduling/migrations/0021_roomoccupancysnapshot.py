@@ -0,0 +1,25 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0020_schedule_occupancy_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancySnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occupancy', models.JSONField(default=dict)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('version', models.IntegerField(default=0)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('term', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='scheduling.term')),
+            ],
+        ),
+    ]
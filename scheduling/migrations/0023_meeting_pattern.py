@@ -0,0 +1,120 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+# scheduling.models.MEETING_PATTERN_FIELDS and get_meeting_pattern as of this
+# migration
+MEETING_PATTERN_FIELDS = ["days_mask", "start_minute", "stop_minute", "duration", "modality"]
+DAYS = "MTWRFSU"
+
+
+def get_meeting_pattern(section, days, start_time, stop_time):
+    mask = 0
+    for bit, name in enumerate(DAYS):
+        if days and name in days:
+            mask |= 1 << bit
+    start = start_time.hour * 60 + start_time.minute if start_time else None
+    stop = stop_time.hour * 60 + stop_time.minute if stop_time else None
+    duration = stop - start if start is not None and stop is not None else None
+    section = section or ""
+    if "NT" in section:
+        modality = "NT"
+    elif "HY" in section:
+        modality = "HY"
+    else:
+        modality = "FF"
+    return [mask, start, stop, duration, modality]
+
+
+def set_meeting_patterns(apps, schema_editor):
+    """derive the meeting pattern of the existing GCIS and CAMS rows"""
+    for name in ["Schedule", "Cams"]:
+        model = apps.get_model("scheduling", name)
+        rows = model.objects.only("section", "days", "start_time", "stop_time")
+        batch = []
+        for row in rows.iterator(chunk_size=5000):
+            values = get_meeting_pattern(row.section, row.days, row.start_time, row.stop_time)
+            for field, value in zip(MEETING_PATTERN_FIELDS, values):
+                setattr(row, field, value)
+            batch.append(row)
+            if len(batch) == 5000:
+                model.objects.bulk_update(batch, MEETING_PATTERN_FIELDS)
+                batch = []
+        model.objects.bulk_update(batch, MEETING_PATTERN_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0022_schedulesummarysnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cams',
+            name='days_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cams',
+            name='duration',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cams',
+            name='modality',
+            field=models.CharField(choices=[('FF', 'Face to face'), ('HY', 'Hybrid'), ('NT', 'Online')], default='FF', editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='cams',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='cams',
+            name='stop_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='days_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='duration',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='modality',
+            field=models.CharField(choices=[('FF', 'Face to face'), ('HY', 'Hybrid'), ('NT', 'Online')], default='FF', editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='stop_minute',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_meeting_patterns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cams',
+            index=models.Index(fields=['term', 'start_minute', 'stop_minute'], name='scheduling__term_id_06e96a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cams',
+            index=models.Index(fields=['term', 'modality', 'days_mask'], name='scheduling__term_id_9ed111_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['term', 'start_minute', 'stop_minute'], name='scheduling__term_id_17b3ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['term', 'modality', 'days_mask'], name='scheduling__term_id_070cce_idx'),
+        ),
+    ]
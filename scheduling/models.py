@@ -1,9 +1,17 @@
+import hashlib
 from datetime import datetime
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .conflicts import to_minutes
+from .timetable import days_mask
 
 
 class Course(models.Model):
@@ -95,6 +103,72 @@ class SoftDeleteModel(models.Model):
     class Meta:
         abstract = True
 
+# foreign keys shown on the schedule lists, the change summary page and in the csv download
+SCHEDULE_RELATED_FIELDS = (
+    "term",
+    "course",
+    "instructor",
+    "campus",
+    "location",
+    "insert_by",
+    "update_by",
+    "deleted_by",
+)
+CAMS_RELATED_FIELDS = ("term", "course", "instructor", "campus", "location")
+
+# modality of a section, from its suffix
+FACE_TO_FACE, HYBRID, ONLINE = "FF", "HY", "NT"
+MODALITY_CHOICES = [
+    (FACE_TO_FACE, "Face to face"),
+    (HYBRID, "Hybrid"),
+    (ONLINE, "Online"),
+]
+
+# columns derived from section, days and times, see set_meeting_pattern
+MEETING_PATTERN_FIELDS = ["days_mask", "start_minute", "stop_minute", "duration", "modality"]
+
+
+def get_modality(section):
+    if "NT" in section:
+        return ONLINE
+    if "HY" in section:
+        return HYBRID
+    return FACE_TO_FACE
+
+
+def get_meeting_pattern(section, days, start_time, stop_time):
+    """MEETING_PATTERN_FIELDS values of a section, minutes are None without times"""
+    start = to_minutes(start_time) if start_time else None
+    stop = to_minutes(stop_time) if stop_time else None
+    duration = stop - start if start is not None and stop is not None else None
+    return [days_mask(days), start, stop, duration, get_modality(section or "")]
+
+
+class ScheduleQuerySet(models.QuerySet):
+    def with_related(self):
+        """join the foreign keys the schedule pages show, str() needs course"""
+        return self.select_related(*SCHEDULE_RELATED_FIELDS)
+
+    def scheduled(self):
+        """sections with days and times, the only ones that can overlap"""
+        return self.filter(
+            days_mask__gt=0, start_minute__isnull=False, stop_minute__isnull=False
+        )
+
+    def meeting(self, days, start, stop):
+        """sections meeting on one of days between start and stop
+
+        days is a string or bitmask, start and stop are times or minutes of
+        the day, see Timetable.overlapping.
+        """
+        mask = days if isinstance(days, int) else days_mask(days)
+        if not isinstance(start, int):
+            start, stop = to_minutes(start), to_minutes(stop)
+        return self.alias(shared_days=F("days_mask").bitand(mask)).filter(
+            shared_days__gt=0, start_minute__lt=stop, stop_minute__gt=start
+        )
+
+
 class Schedule(SoftDeleteModel):
 
     STATUS_CHOICES = [("OPEN", "Open"), ("CLOSED", "Closed"), ("CANCELED", "Canceled")]
@@ -134,6 +208,16 @@ class Schedule(SoftDeleteModel):
         auto_now=False, auto_now_add=False, blank=True, null=True
     )
 
+    # days bitmask (M = 1 ... U = 64), minutes of the day and minutes per
+    # meeting, kept by set_meeting_pattern
+    days_mask = models.PositiveSmallIntegerField(default=0, editable=False)
+    start_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    stop_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    duration = models.SmallIntegerField(null=True, blank=True, editable=False)
+    modality = models.CharField(
+        max_length=2, choices=MODALITY_CHOICES, default=FACE_TO_FACE, editable=False
+    )
+
     # insert by who and when
     insert_date = models.DateTimeField(auto_now=False, auto_now_add=True)
     insert_by = models.ForeignKey(
@@ -148,11 +232,55 @@ class Schedule(SoftDeleteModel):
 
     notes = models.CharField(default="", max_length=100, blank=True, null=True)
 
+    objects = ScheduleQuerySet.as_manager()
+
     def __str__(self):
         return self.course.__str__() + self.section
 
     class Meta:
         ordering = ["term", "course", "section"]
+        indexes = [
+            # occupancy of an instructor or room in a term, see ScheduleForm
+            models.Index(fields=["term", "instructor"]),
+            models.Index(fields=["term", "location"]),
+            # sections meeting in a time window or of a modality
+            models.Index(fields=["term", "start_minute", "stop_minute"]),
+            models.Index(fields=["term", "modality", "days_mask"]),
+        ]
+
+
+class CamsLoad(models.Model):
+    """One load of CAMS data for a term
+
+    A load is staged next to the live one and only made live once it is
+    complete, the previous load is kept for a rollback. See scheduling.cams.
+    """
+
+    LOADING = "loading"
+    LIVE = "live"
+    RETIRED = "retired"
+    STATUS_CHOICES = [(LOADING, "Loading"), (LIVE, "Live"), (RETIRED, "Retired")]
+
+    term = models.ForeignKey(Term, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=LOADING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.term} {self.created_at:%Y-%m-%d %H:%M} {self.status}"
+
+
+class CamsQuerySet(models.QuerySet):
+    def with_related(self):
+        """join the foreign keys the change summary shows, str() needs course"""
+        return self.select_related(*CAMS_RELATED_FIELDS)
+
+
+class LiveCamsManager(models.Manager.from_queryset(CamsQuerySet)):
+    """CAMS rows of live loads only"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(load__status=CamsLoad.LIVE)
 
 
 class Cams(models.Model):
@@ -196,12 +324,90 @@ class Cams(models.Model):
         auto_now=False, auto_now_add=False, blank=True, null=True
     )
 
+    # days bitmask (M = 1 ... U = 64), minutes of the day and minutes per
+    # meeting, kept by set_meeting_pattern
+    days_mask = models.PositiveSmallIntegerField(default=0, editable=False)
+    start_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    stop_minute = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    duration = models.SmallIntegerField(null=True, blank=True, editable=False)
+    modality = models.CharField(
+        max_length=2, choices=MODALITY_CHOICES, default=FACE_TO_FACE, editable=False
+    )
+
+    # hash of CAMS_FINGERPRINT_FIELDS, incremental loads skip unchanged rows
+    fingerprint = models.CharField(max_length=32, blank=True, default="", editable=False)
+
+    load = models.ForeignKey(
+        CamsLoad, on_delete=models.CASCADE, null=True, blank=True, editable=False
+    )
+
+    # rows of every load, staged and retired ones too
+    objects = CamsQuerySet.as_manager()
+    live = LiveCamsManager()
+
     def __str__(self):
         return self.course.__str__() + self.section
 
     class Meta:
         verbose_name = "CAMS"
         verbose_name_plural = "CAMS"
+        indexes = [
+            models.Index(fields=["term", "start_minute", "stop_minute"]),
+            models.Index(fields=["term", "modality", "days_mask"]),
+        ]
+
+
+# everything but the (term, course, section) key of a CAMS row
+CAMS_FINGERPRINT_FIELDS = [
+    "capacity",
+    "instructor_id",
+    "status",
+    "campus_id",
+    "location_id",
+    "days",
+    "start_time",
+    "stop_time",
+]
+
+
+def get_cams_fingerprint(values):
+    """fingerprint of CAMS_FINGERPRINT_FIELDS values"""
+    content = "\x1f".join("\\N" if value is None else str(value) for value in values)
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+@receiver(pre_save, sender=Cams)
+def set_cams_fingerprint(sender, instance, **kwargs):
+    instance.fingerprint = get_cams_fingerprint(
+        getattr(instance, field) for field in CAMS_FINGERPRINT_FIELDS
+    )
+
+
+@receiver(pre_save, sender=Schedule)
+@receiver(pre_save, sender=Cams)
+def set_meeting_pattern(sender, instance, **kwargs):
+    values = get_meeting_pattern(
+        instance.section, instance.days, instance.start_time, instance.stop_time
+    )
+    for field, value in zip(MEETING_PATTERN_FIELDS, values):
+        setattr(instance, field, value)
+
+
+def get_live_cams_load(term_id):
+    """the live CamsLoad of a term, created if the term has none yet"""
+    load = CamsLoad.objects.filter(term_id=term_id, status=CamsLoad.LIVE).first()
+    if load is None:
+        load = CamsLoad.objects.create(
+            term_id=term_id, status=CamsLoad.LIVE, activated_at=timezone.now()
+        )
+    return load
+
+
+@receiver(pre_save, sender=Cams)
+def set_cams_load(sender, instance, **kwargs):
+    # rows entered by hand belong to the live load of their term
+    if instance.load_id is None or instance.load.term_id != instance.term_id:
+        instance.load = get_live_cams_load(instance.term_id)
 
 
 class Dates(models.Model):
@@ -213,3 +419,197 @@ class Dates(models.Model):
     class Meta:
         verbose_name = "Dates"
         verbose_name_plural = "Dates"
+
+
+class SnapshotQuerySet(models.QuerySet):
+    def invalidate(self):
+        """mark the snapshots stale"""
+        return self.update(is_stale=True, version=F("version") + 1)
+
+
+class Snapshot(models.Model):
+    """A value computed from the sections of a term, kept until they change
+
+    Subclasses add the fields the value is looked up by and the JSONField
+    named by value_field, see get_or_rebuild.
+    """
+
+    value_field = None
+
+    is_stale = models.BooleanField(default=True)
+    # bumped on every invalidation so a rebuild never overwrites newer changes
+    version = models.IntegerField(default=0)
+    built_at = models.DateTimeField(blank=True, null=True)
+
+    objects = SnapshotQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_or_rebuild(cls, build, **lookup):
+        """value of the snapshot at lookup, build() again if missing or stale
+
+        No lock is held while build() runs, saves invalidating the snapshot
+        never wait for it. The write is one conditional UPDATE, so the
+        snapshot stays stale if it was invalidated meanwhile and concurrent
+        rebuilds of the same version only write the same value twice.
+        """
+        snapshot, _ = cls.objects.get_or_create(**lookup)
+        if not snapshot.is_stale:
+            return getattr(snapshot, cls.value_field)
+        version = snapshot.version
+        value = build()
+        cls.objects.filter(pk=snapshot.pk, version=version).update(
+            **{cls.value_field: value}, is_stale=False, built_at=timezone.now()
+        )
+        return value
+
+
+class ChangeSummarySnapshot(Snapshot):
+    """GCIS vs CAMS changes of one subject in a term, see scheduling.diff"""
+
+    value_field = "diff"
+
+    term = models.ForeignKey(Term, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=4)
+
+    # GcisCamsDiff.to_dict()
+    diff = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.term}-{self.subject}"
+
+    class Meta:
+        unique_together = ["term", "subject"]
+
+
+def invalidate_change_summary(term_id, subjects=None):
+    """mark change summaries of a term stale, only for subjects if given"""
+    snapshots = ChangeSummarySnapshot.objects.filter(term_id=term_id)
+    if subjects is not None:
+        snapshots = snapshots.filter(subject__in=subjects)
+    snapshots.invalidate()
+
+
+class RoomOccupancySnapshot(Snapshot):
+    """Meetings of the rooms of a term, see scheduling.rooms"""
+
+    value_field = "occupancy"
+
+    term = models.OneToOneField(Term, on_delete=models.CASCADE)
+
+    # RoomOccupancy.to_dict()
+    occupancy = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.term}"
+
+
+def invalidate_room_occupancy(term_ids):
+    """mark the room occupancy of terms stale"""
+    RoomOccupancySnapshot.objects.filter(term_id__in=term_ids).invalidate()
+
+
+class ScheduleSummarySnapshot(Snapshot):
+    """Section counts and conflicts of a set of subjects in a term, see scheduling.summary"""
+
+    value_field = "summary"
+
+    term = models.ForeignKey(Term, on_delete=models.CASCADE)
+    # sorted, comma separated subjects
+    subjects = models.TextField()
+
+    # ids and counts, names are read when the summary is shown
+    summary = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.term}-{self.subjects}"
+
+    class Meta:
+        unique_together = ["term", "subjects"]
+
+
+def invalidate_schedule_summary(term_ids=None):
+    """mark the schedule summaries of terms stale, of every term if None"""
+    snapshots = ScheduleSummarySnapshot.objects.all()
+    if term_ids is not None:
+        snapshots = snapshots.filter(term_id__in=term_ids)
+    snapshots.invalidate()
+
+
+def delete_without_signals(queryset):
+    """delete the rows of a Schedule or Cams queryset with one query
+
+    The delete receivers below cost a query per row, bulk paths delete
+    without them and invalidate the snapshots they touch themselves.
+    Nothing references Schedule and Cams rows, there is nothing to cascade.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def get_schedule_keys(model, pk):
+    """(term_id, subject) pairs a stored schedule belongs to"""
+    if pk is None:
+        return []
+    return list(
+        model.objects.filter(pk=pk).values_list("term_id", "course__subject")
+    )
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_subject(sender, instance, **kwargs):
+    instance._previous_subject = (
+        Course.objects.filter(pk=instance.pk).values_list("subject", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_change_summary_for_course(sender, instance, **kwargs):
+    # a subject's courses changed, its snapshots are stale in every term
+    subjects = {instance.subject, getattr(instance, "_previous_subject", None)}
+    ChangeSummarySnapshot.objects.filter(subject__in=subjects - {None}).invalidate()
+    # the summaries group courses by subject
+    invalidate_schedule_summary()
+
+
+@receiver(post_delete, sender=Instructor)
+def invalidate_snapshots_for_instructor(sender, instance, **kwargs):
+    # the instructor's sections were set to NULL without signals; a rename
+    # needs nothing, snapshots hold ids and names are read when shown
+    invalidate_schedule_summary()
+    ChangeSummarySnapshot.objects.invalidate()
+
+
+@receiver(pre_save, sender=Schedule)
+@receiver(pre_delete, sender=Schedule)
+@receiver(pre_save, sender=Cams)
+@receiver(pre_delete, sender=Cams)
+def remember_change_summary_keys(sender, instance, **kwargs):
+    # a schedule moved to another term or course invalidates the old one too
+    instance._change_summary_keys = get_schedule_keys(sender, instance.pk)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=Cams)
+@receiver(post_delete, sender=Cams)
+def invalidate_change_summary_for_schedule(sender, instance, **kwargs):
+    keys = getattr(instance, "_change_summary_keys", [])
+    if "created" in kwargs:
+        keys = keys + get_schedule_keys(sender, instance.pk)
+    for term_id, subject in set(keys):
+        if term_id:
+            invalidate_change_summary(term_id, [subject])
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def invalidate_term_snapshots_for_schedule(sender, instance, **kwargs):
+    term_ids = {term_id for term_id, _ in getattr(instance, "_change_summary_keys", [])}
+    term_ids.add(instance.term_id)
+    invalidate_room_occupancy(term_ids - {None})
+    invalidate_schedule_summary(term_ids - {None})
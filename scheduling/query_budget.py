@@ -0,0 +1,171 @@
+"""Query budgets for tests.
+
+A page must run the same number of queries whatever the amount of data it
+shows, a template touching a foreign key on every row runs one query per
+row. QueryBudgetMixin replays every url of a url conf against seeded data
+at two sizes and fails when a page's query count grows with the data or goes
+over its budget, listing the queries grouped by the code that ran them.
+"""
+import os
+import sys
+from collections import Counter, defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+PROJECT_DIR = os.path.abspath(settings.BASE_DIR)
+THIS_FILE = os.path.abspath(__file__)
+
+
+def get_call_site():
+    """innermost line of project code and template running the current query"""
+    code = template = None
+    frame = sys._getframe(2)
+    while frame and not (code and template):
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if (
+            code is None
+            and filename.startswith(PROJECT_DIR)
+            and filename != THIS_FILE
+            and "site-packages" not in filename
+            and os.path.basename(filename) != "manage.py"
+        ):
+            code = (
+                f"{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        if template is None and frame.f_code.co_name == "render_annotated":
+            # the template node being rendered, e.g. {{ schedule.course }}
+            node = frame.f_locals.get("self")
+            origin, token = getattr(node, "origin", None), getattr(node, "token", None)
+            if origin and token:
+                template = f"{origin.template_name}:{token.lineno}"
+        frame = frame.f_back
+    call_site = code or "django"
+    if template:
+        call_site += f" (template {template})"
+    return call_site
+
+
+class QueryLog:
+    """connection.execute_wrapper recording every query with its call site"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((get_call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def by_call_site(self):
+        """{call site: (queries, first sql)}"""
+        counts, examples = Counter(), {}
+        for call_site, sql in self.queries:
+            counts[call_site] += 1
+            examples.setdefault(call_site, sql)
+        return {call_site: (counts[call_site], examples[call_site]) for call_site in counts}
+
+
+def format_query_logs(logs, sizes):
+    """the queries of every call site at each data size, growing ones first"""
+    call_sites = defaultdict(lambda: [0] * len(logs))
+    examples = {}
+    for i, log in enumerate(logs):
+        for call_site, (count, sql) in log.by_call_site().items():
+            call_sites[call_site][i] = count
+            examples.setdefault(call_site, sql)
+
+    lines = []
+    for call_site, counts in sorted(
+        call_sites.items(), key=lambda item: (item[1][0] - item[1][-1], item[0])
+    ):
+        counts = " -> ".join(f"{count} (size {size})" for count, size in zip(counts, sizes))
+        lines.append(f"  {counts}  {call_site}")
+        lines.append(f"      {examples[call_site][:300]}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    """Replays every url of urlconf at each of SIZES, for a TestCase
+
+    Subclasses set urlconf and BUDGETS, the most queries each url name may
+    run, and implement seed(size) to create the data of a size. seed sets
+    self.url_kwargs, the values of the url parameters, which also fill the
+    QUERY_STRINGS of url names needing one. A url requested in several ways
+    has a budget and a query string per variant, keyed "name (variant)".
+    Pages are requested as self.user once to build their caches, after
+    reset_caches() they are measured.
+    """
+
+    urlconf = None
+    BUDGETS = {}
+    QUERY_STRINGS = {}
+    SIZES = (1, 4)
+
+    def seed(self, size):
+        raise NotImplementedError
+
+    def reset_caches(self):
+        pass
+
+    def get_patterns(self):
+        return {
+            pattern.name: pattern
+            for pattern in import_module(self.urlconf).urlpatterns
+            if pattern.name
+        }
+
+    def get_url_name(self, name):
+        """url name of a BUDGETS key, "search (time)" is a search"""
+        return name.split(" (")[0]
+
+    def get_url(self, name, pattern):
+        kwargs = {key: self.url_kwargs[key] for key in pattern.pattern.converters}
+        query_string = self.QUERY_STRINGS.get(name, "").format(**self.url_kwargs)
+        return reverse(pattern.name, kwargs=kwargs) + query_string
+
+    def measure(self, url):
+        self.client.force_login(self.user)
+        self.client.get(url)
+        self.reset_caches()
+
+        # logout in the url conf ends the session
+        self.client.force_login(self.user)
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertIn(response.status_code, [200, 302], url)
+        return log
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(
+            set(self.get_patterns()), set(map(self.get_url_name, self.BUDGETS))
+        )
+
+    def test_query_budgets(self):
+        patterns = self.get_patterns()
+        logs, urls = defaultdict(list), {}
+        for size in self.SIZES:
+            self.seed(size)
+            for name in sorted(self.BUDGETS):
+                pattern = patterns[self.get_url_name(name)]
+                urls[name] = self.get_url(name, pattern)
+                logs[name].append(self.measure(urls[name]))
+
+        for name, name_logs in logs.items():
+            counts = [len(log) for log in name_logs]
+            budget = self.BUDGETS[name]
+            with self.subTest(name):
+                if len(set(counts)) > 1 or max(counts) > budget:
+                    self.fail(
+                        f"{urls[name]} ran {' -> '.join(map(str, counts))} queries at data "
+                        f"sizes {self.SIZES}, its budget is {budget}:\n"
+                        + format_query_logs(name_logs, self.SIZES)
+                    )
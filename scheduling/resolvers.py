@@ -0,0 +1,135 @@
+"""Resolve natural keys of courses, instructors, campuses and locations.
+
+Bulk loads see the same few thousand names over and over, NaturalKeyResolver
+reads each table once and answers lookups from dictionaries. Missing
+instructors and locations are created in bulk, unknown courses and campuses
+are errors.
+"""
+import re
+from collections import Counter
+
+from django.db import connection
+
+from .models import Campus, Course, Instructor, Location
+
+COURSE_PATTERN = re.compile(r"^([A-Z]{4})\s*(\w{4})$")
+
+
+def parse_course(value):
+    """(subject, number) of BIOL 1406 or BIOL1406"""
+    match = COURSE_PATTERN.match(value.strip().upper())
+    if not match:
+        raise ValueError(f"invalid course {value!r}")
+    return match.group(1), match.group(2)
+
+
+def parse_instructor(value):
+    """(first name, last name) of "Last, First", None if empty"""
+    value = value.strip()
+    if not value:
+        return None
+    last_name, _, first_name = value.partition(",")
+    return first_name.strip(), last_name.strip()
+
+
+def parse_location(value):
+    """(building, room) of "LIB 102", None if empty"""
+    value = value.strip()
+    if not value:
+        return None
+    building, _, room = value.partition(" ")
+    return building, room.strip()
+
+
+class NaturalKeyResolver:
+    """Course, Instructor, Campus and Location instances by natural key
+
+    stats counts the hits and misses of every lookup and the rows created,
+    per table.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+        self.courses = {(c.subject, c.number): c for c in Course.objects.all()}
+        self.campuses = {c.name: c for c in Campus.objects.all()}
+        self.instructors = {
+            (i.first_name, i.last_name): i for i in Instructor.objects.all()
+        }
+        self.locations = {(l.building, l.room): l for l in Location.objects.all()}
+
+    def lookup(self, table, cache, key, label):
+        try:
+            found = cache[key]
+        except KeyError:
+            self.stats[table, "misses"] += 1
+            raise ValueError(f"unknown {table} {label}") from None
+        self.stats[table, "hits"] += 1
+        return found
+
+    def course(self, key):
+        """key is (subject, number) or a string for parse_course"""
+        if isinstance(key, str):
+            key = parse_course(key)
+        return self.lookup("course", self.courses, key, "".join(key))
+
+    def campus(self, name):
+        if not name:
+            return None
+        return self.lookup("campus", self.campuses, name, name)
+
+    def instructor(self, key):
+        """key is (first name, last name) or a string for parse_instructor"""
+        if isinstance(key, str):
+            key = parse_instructor(key)
+        if key is None:
+            return None
+        return self.lookup("instructor", self.instructors, key, "{1}, {0}".format(*key))
+
+    def location(self, key):
+        """key is (building, room) or a string for parse_location"""
+        if isinstance(key, str):
+            key = parse_location(key)
+        if key is None or not key[0]:
+            return None
+        return self.lookup("location", self.locations, key, " ".join(key))
+
+    def create_missing(self, instructors=(), locations=()):
+        """bulk create the instructors and locations that do not exist yet"""
+        self.create(
+            "instructor",
+            Instructor,
+            ["first_name", "last_name"],
+            self.instructors,
+            {key for key in instructors if key},
+        )
+        self.create(
+            "location",
+            Location,
+            ["building", "room"],
+            self.locations,
+            {key for key in locations if key and key[0]},
+        )
+
+    def create(self, table, model, fields, cache, keys):
+        missing = sorted(key for key in keys if key not in cache)
+        if not missing:
+            return
+        created = model.objects.bulk_create(
+            [model(**dict(zip(fields, key))) for key in missing]
+        )
+        self.stats[table, "created"] += len(missing)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # no primary keys on the created rows, read them back
+            created = model.objects.filter(
+                **{f"{fields[0]}__in": {key[0] for key in missing}}
+            )
+        for obj in created:
+            cache.setdefault(tuple(getattr(obj, field) for field in fields), obj)
+
+    def report(self):
+        """{table: {"hits": n, "misses": n, "created": n}}"""
+        report = {}
+        for (table, counter), count in sorted(self.stats.items()):
+            report.setdefault(table, {"hits": 0, "misses": 0, "created": 0})
+            report[table][counter] = count
+        return report
@@ -0,0 +1,137 @@
+"""Free rooms of a term.
+
+RoomOccupancy holds the meetings of the rooms of a term in parallel NumPy
+arrays. It is built once from the term's sections and kept in a
+RoomOccupancySnapshot until a Schedule of the term changes, so finding the
+rooms free for a time window is a few vectorized comparisons instead of a
+scan of the sections.
+"""
+import numpy as np
+
+from .conflicts import to_minutes
+from .models import ONLINE, RoomOccupancySnapshot, Schedule
+from .timetable import days_mask
+
+MINUTES_PER_DAY = 24 * 60
+
+# one list per meeting column, see RoomOccupancy.to_dict
+OCCUPANCY_FIELDS = ["location", "campus", "days", "start", "stop", "capacity"]
+
+
+class RoomOccupancy:
+    """Meetings of rooms, one row per section with a room, days and times
+
+    Online (NT) and deleted sections occupy no room.
+    """
+
+    def __init__(self, location, campus, days, start, stop, capacity):
+        self.location = np.array(location, dtype=np.int32)
+        self.campus = np.array(campus, dtype=np.int32)
+        self.days = np.array(days, dtype=np.uint8)
+        self.start = np.array(start, dtype=np.int16)
+        self.stop = np.array(stop, dtype=np.int16)
+        self.capacity = np.array(capacity, dtype=np.int32)
+        # rooms sorted by id, room_index is the room of every row
+        self.rooms, self.room_index = np.unique(self.location, return_inverse=True)
+
+    @classmethod
+    def from_schedules(cls, schedules):
+        rows = (
+            schedules.scheduled()
+            .filter(is_deleted=False, location__isnull=False)
+            .exclude(modality=ONLINE)
+            .values_list(
+                "location_id",
+                "campus_id",
+                "days_mask",
+                "start_minute",
+                "stop_minute",
+                "capacity",
+            )
+        )
+        columns = [[] for _ in OCCUPANCY_FIELDS]
+        for location, campus, mask, start, stop, capacity in rows:
+            row = [location, campus or 0, mask, start, stop, capacity]
+            for column, value in zip(columns, row):
+                column.append(value)
+        return cls(*columns)
+
+    def to_dict(self):
+        """json friendly copy for RoomOccupancySnapshot"""
+        return {field: getattr(self, field).tolist() for field in OCCUPANCY_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*[data.get(field, []) for field in OCCUPANCY_FIELDS])
+
+    def free_rooms(self, locations, days, start, stop, campus=None, capacity=None):
+        """the locations free on every one of days from start to stop, best fit first
+
+        Rooms whose sections hold at least capacity students come first,
+        smallest first, then rooms leaving the smallest gaps to their other
+        meetings that day, so large free blocks stay free. Seats are the
+        largest capacity of the room's sections this term, None for rooms
+        without sections. With campus, only rooms used by that campus this
+        term are free.
+        """
+        mask = days_mask(days)
+        start, stop = to_minutes(start), to_minutes(stop)
+        rooms = len(self.rooms)
+
+        on_days = (self.days & mask) != 0
+        overlap = on_days & (self.start < stop) & (self.stop > start)
+        busy = np.zeros(rooms, dtype=bool)
+        busy[self.room_index[overlap]] = True
+
+        # minutes between the window and the room's meetings before and after it
+        before = np.full(rooms, start, dtype=np.int32)
+        earlier = on_days & (self.stop <= start)
+        np.minimum.at(before, self.room_index[earlier], start - self.stop[earlier])
+        after = np.full(rooms, MINUTES_PER_DAY - stop, dtype=np.int32)
+        later = on_days & (self.start >= stop)
+        np.minimum.at(after, self.room_index[later], self.start[later] - stop)
+
+        seats = np.zeros(rooms, dtype=np.int32)
+        np.maximum.at(seats, self.room_index, self.capacity)
+
+        if campus is not None:
+            campus_rooms = set(self.location[self.campus == campus.pk].tolist())
+
+        room_list = []
+        for location in locations:
+            if campus is not None and location.pk not in campus_rooms:
+                continue
+            i = np.searchsorted(self.rooms, location.pk)
+            if i < rooms and self.rooms[i] == location.pk:
+                if busy[i]:
+                    continue
+                room = (location, int(seats[i]), int(before[i]), int(after[i]))
+            else:
+                room = (location, None, start, MINUTES_PER_DAY - stop)
+            room_list.append(room)
+
+        def fit(room):
+            location, seats, before, after = room
+            if capacity:
+                too_small = seats is None or seats < capacity
+                spare = seats - capacity if not too_small else 0
+            else:
+                too_small, spare = False, 0
+            return too_small, spare, before + after, str(location)
+
+        return [
+            {"location": location, "seats": seats, "before": before, "after": after}
+            for location, seats, before, after in sorted(room_list, key=fit)
+        ]
+
+
+def get_room_occupancy(term):
+    """occupancy of the rooms of a term, rebuilt only if missing or stale"""
+    return RoomOccupancy.from_dict(
+        RoomOccupancySnapshot.get_or_rebuild(
+            lambda: RoomOccupancy.from_schedules(
+                Schedule.objects.filter(term=term)
+            ).to_dict(),
+            term=term,
+        )
+    )
@@ -0,0 +1,58 @@
+"""Section counts and conflicts of a set of subjects in a term.
+
+A summary is one aggregated query for the counts and one scan of the
+sections for the conflicts. It only holds ids and counts and is kept in a
+ScheduleSummarySnapshot until a Schedule of the term changes or an
+instructor is deleted, renaming an instructor or a room never leaves it out
+of date.
+"""
+from collections import Counter
+
+from django.db.models import Count
+
+from .conflicts import CONFLICT_FIELDS, find_conflicts
+from .models import Schedule, ScheduleSummarySnapshot
+
+
+def build_schedule_summary(term, subjects):
+    """{"courses": [[course id, sections]], "instructors": [[instructor id, sections]],
+    "not_assigned": sections, "conflicts": {"instructor": [[id, section id,
+    other section id, days]], "location": [...]}} of the non-deleted sections"""
+    schedules = Schedule.objects.filter(
+        term=term, course__subject__in=subjects, is_deleted=False
+    )
+
+    by_course, by_instructor = Counter(), Counter()
+    for row in (
+        schedules.values("course_id", "instructor_id")
+        .annotate(sections=Count("id"))
+        .order_by()
+    ):
+        by_course[row["course_id"]] += row["sections"]
+        by_instructor[row["instructor_id"]] += row["sections"]
+    not_assigned = by_instructor.pop(None, 0)
+
+    conflicts = find_conflicts(schedules.scheduled().values(*CONFLICT_FIELDS))
+    return {
+        "courses": sorted(by_course.items(), key=lambda item: (-item[1], item[0])),
+        "instructors": sorted(
+            by_instructor.items(), key=lambda item: (-item[1], item[0])
+        ),
+        "not_assigned": not_assigned,
+        "conflicts": {
+            resource: [[*key, days] for key, days in sorted(overlaps.items())]
+            for resource, overlaps in conflicts.items()
+        },
+    }
+
+
+def get_schedule_summary(term, subjects):
+    """summary of the subjects of a term, rebuilt only if missing or stale"""
+    subjects = ",".join(
+        sorted(set(subject.strip().upper() for subject in subjects if subject.strip()))
+    )
+    return ScheduleSummarySnapshot.get_or_rebuild(
+        lambda: build_schedule_summary(term, subjects.split(",") if subjects else []),
+        term=term,
+        subjects=subjects,
+    )
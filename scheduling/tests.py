@@ -1,3 +1,1408 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+from datetime import time
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cams import CAMS_CSV_COLUMNS, CamsLoader, load_cams_parallel, prune_cams_loads
+from .conflicts import find_conflicts
+from .diff import diff_gcis_cams, get_change_summary, get_deleted_in_gcis
+from .forms import ScheduleForm
+from .models import (
+    FACE_TO_FACE,
+    HYBRID,
+    ONLINE,
+    Campus,
+    Cams,
+    CamsLoad,
+    ChangeSummarySnapshot,
+    Course,
+    Dates,
+    Instructor,
+    Location,
+    RoomOccupancySnapshot,
+    Schedule,
+    ScheduleSummarySnapshot,
+    Term,
+    delete_without_signals,
+    invalidate_change_summary,
+    invalidate_room_occupancy,
+    invalidate_schedule_summary,
+)
+from .query_budget import QueryBudgetMixin
+from .resolvers import NaturalKeyResolver
+from .rooms import RoomOccupancy
+from .timetable import Timetable
+from .views import get_diff_gcis_cams
+
+
+class DiffFixtureMixin:
+    """one term with every kind of GCIS/CAMS difference"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.term = Term.objects.create(year=2023, semester="FALL", active="T")
+        cls.biol = Course.objects.create(
+            subject="BIOL", number="1406", credit=4, name="Biology I"
+        )
+        cls.chem = Course.objects.create(
+            subject="CHEM", number="1411", credit=4, name="Chemistry I"
+        )
+        cls.smith = Instructor.objects.create(first_name="Jane", last_name="Smith")
+        cls.jones = Instructor.objects.create(first_name="Bob", last_name="Jones")
+        cls.main = Campus.objects.create(name="Main")
+        cls.room = Location.objects.create(building="LIB", room="102")
+
+        def row(course, section, **kwargs):
+            values = {
+                "term": cls.term,
+                "course": course,
+                "section": section,
+                "capacity": 24,
+                "instructor": cls.smith,
+                "status": "OPEN",
+                "campus": cls.main,
+                "location": cls.room,
+                "days": "MW",
+                "start_time": time(9, 0),
+                "stop_time": time(10, 15),
+            }
+            values.update(kwargs)
+            return values
+
+        # unchanged
+        Schedule.objects.create(**row(cls.biol, "A01"))
+        Cams.objects.create(**row(cls.biol, "A01"))
+        # capacity, instructor and days changed
+        Schedule.objects.create(**row(cls.biol, "A02", capacity=30, days="TR"))
+        Cams.objects.create(**row(cls.biol, "A02", instructor=cls.jones))
+        # added in GCIS
+        Schedule.objects.create(**row(cls.biol, "A03"))
+        # only in CAMS
+        Cams.objects.create(**row(cls.biol, "A04"))
+        # canceled on both sides
+        Schedule.objects.create(**row(cls.biol, "A05", status="CANCELED", capacity=1))
+        Cams.objects.create(**row(cls.biol, "A05", status="CANCELED"))
+        # empty days in GCIS match null days in CAMS
+        Schedule.objects.create(**row(cls.chem, "A01NT", days=""))
+        Cams.objects.create(**row(cls.chem, "A01NT", days=None))
+        # deleted in GCIS and still in CAMS
+        Schedule.objects.create(**row(cls.chem, "A02", is_deleted=True))
+        Cams.objects.create(**row(cls.chem, "A02"))
+        # deleted in GCIS and never in CAMS
+        Schedule.objects.create(**row(cls.chem, "A03", is_deleted=True))
+        # canceled in GCIS
+        Schedule.objects.create(**row(cls.chem, "A04", status="CANCELED"))
+        Cams.objects.create(**row(cls.chem, "A04"))
+
+    def run_engine(self, engine):
+        diff = diff_gcis_cams(self.term, Course.objects.all(), engine)
+        return {
+            "gcis_changed": diff.gcis_changed,
+            "cams_changed": diff.cams_changed,
+            "added": diff.added,
+            "deleted_gcis": diff.deleted_gcis,
+            "deleted_cams": diff.deleted_cams,
+            "total_changes": diff.total_changes,
+            "gcis_changed_cols": dict(diff.gcis_changed_cols),
+            "cams_changed_cols": dict(diff.cams_changed_cols),
+        }
+
+
+class DiffEngineTests(DiffFixtureMixin, TestCase):
+    def gcis(self, course, section):
+        return Schedule.objects.get(course=course, section=section).pk
+
+    def cams(self, course, section):
+        return Cams.objects.get(course=course, section=section).pk
+
+    def test_python_engine(self):
+        result = self.run_engine("python")
+
+        self.assertEqual(
+            result["gcis_changed"], [self.gcis(self.biol, "A02"), self.gcis(self.chem, "A04")]
+        )
+        self.assertEqual(
+            result["cams_changed"], [self.cams(self.biol, "A02"), self.cams(self.chem, "A04")]
+        )
+        self.assertEqual(result["added"], [self.gcis(self.biol, "A03")])
+        self.assertEqual(result["deleted_gcis"], [self.gcis(self.chem, "A02")])
+        self.assertEqual(
+            result["deleted_cams"], [self.cams(self.biol, "A04"), self.cams(self.chem, "A02")]
+        )
+        self.assertEqual(result["total_changes"], 9)
+        self.assertEqual(
+            result["gcis_changed_cols"],
+            {
+                "capacity": {self.gcis(self.biol, "A02")},
+                "instructor": {self.gcis(self.biol, "A02")},
+                "days": {self.gcis(self.biol, "A02")},
+                "status": {self.gcis(self.chem, "A04")},
+            },
+        )
+
+    def test_pandas_engine_agrees(self):
+        self.assertEqual(self.run_engine("pandas"), self.run_engine("python"))
+
+    @skipUnless(connection.vendor == "postgresql", "the sql engine needs PostgreSQL")
+    def test_sql_engine_agrees(self):
+        self.assertEqual(self.run_engine("sql"), self.run_engine("pandas"))
+
+    def test_blank_and_null_are_equal(self):
+        engines = ["python", "pandas"]
+        if connection.vendor == "postgresql":
+            engines.append("sql")
+        expected = self.run_engine("python")
+        # no days in GCIS, blank days in CAMS, no instructor on either side
+        for model, days in [(Schedule, None), (Cams, "")]:
+            model.objects.create(
+                term=self.term,
+                course=self.biol,
+                section="A06",
+                capacity=24,
+                status="OPEN",
+                campus=self.main,
+                days=days,
+            )
+        for engine in engines:
+            with self.subTest(engine):
+                self.assertEqual(self.run_engine(engine), expected)
+
+    def test_rows_of_other_loads_are_left_out(self):
+        expected = self.run_engine("python")
+        staged = CamsLoad.objects.create(term=self.term)
+        Cams.objects.create(
+            term=self.term, course=self.biol, section="A03", capacity=24, load=staged
+        )
+        engines = ["python", "pandas"]
+        if connection.vendor == "postgresql":
+            engines.append("sql")
+        for engine in engines:
+            with self.subTest(engine):
+                self.assertEqual(self.run_engine(engine), expected)
+
+    def test_misconfigured_engine(self):
+        engines = ["pandas-free"]
+        if connection.vendor != "postgresql":
+            engines.append("sql")
+        for engine in engines:
+            with self.subTest(engine), override_settings(GCIS_CAMS_DIFF_ENGINE=engine):
+                with self.assertRaises(ImproperlyConfigured):
+                    self.run_engine(None)
+
+
+class HydrateDiffTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.term = Term.objects.create(year=2024, semester="SPRING", active="T")
+        cls.course = Course.objects.create(
+            subject="MATH", number="1314", credit=3, name="College Algebra"
+        )
+        cls.smith = Instructor.objects.create(first_name="Jane", last_name="Smith")
+        cls.main = Campus.objects.create(name="Main")
+        cls.room = Location.objects.create(building="LIB", room="102")
+        values = {
+            "term": cls.term,
+            "course": cls.course,
+            "capacity": 24,
+            "instructor": cls.smith,
+            "status": "OPEN",
+            "campus": cls.main,
+            "location": cls.room,
+            "days": "MW",
+            "start_time": time(9, 0),
+            "stop_time": time(10, 15),
+        }
+        # only in CAMS, created first so ids and sections disagree on the order
+        cls.cams_only = Cams.objects.create(section="A03", **values)
+        cls.changed = Schedule.objects.create(
+            section="A01", **dict(values, capacity=30)
+        )
+        cls.changed_cams = Cams.objects.create(section="A01", **values)
+        cls.gcis_only = Schedule.objects.create(section="A02", **values)
+
+    def test_small_term(self):
+        # four for the diff and one per list, none per row
+        with self.assertNumQueries(8):
+            result = get_diff_gcis_cams(self.term, Course.objects.all())
+            gcis_changed, cams_changed, added, deleted, total_changes = result
+            for s in gcis_changed + cams_changed + added + deleted:
+                str(s.course), str(s.instructor), str(s.campus), str(s.location)
+
+        self.assertEqual([s.pk for s in gcis_changed], [self.changed.pk])
+        self.assertEqual([s.pk for s in cams_changed], [self.changed_cams.pk])
+        self.assertEqual([s.pk for s in added], [self.gcis_only.pk])
+        self.assertEqual([s.pk for s in deleted], [self.cams_only.pk])
+        self.assertIsInstance(gcis_changed[0], Schedule)
+        self.assertIsInstance(cams_changed[0], Cams)
+        self.assertIsInstance(deleted[0], Cams)
+        # the changed pair counts once on each side
+        self.assertEqual(total_changes, 4)
+
+
+class DeletedInGcisTests(DiffFixtureMixin, TestCase):
+    def delete_sections(self, sections):
+        for section in sections:
+            Cams.objects.create(
+                term=self.term, course=self.biol, section=section, capacity=24
+            )
+            Schedule.objects.create(
+                term=self.term,
+                course=self.biol,
+                section=section,
+                capacity=24,
+                is_deleted=True,
+            )
+
+    def test_only_sections_still_in_cams(self):
+        self.assertEqual(
+            get_deleted_in_gcis(self.term, Course.objects.all()),
+            [Schedule.objects.get(course=self.chem, section="A02").pk],
+        )
+
+    def test_constant_number_of_queries(self):
+        course_list = Course.objects.all()
+        expected = 1
+        for sections in [["D01"], [f"E{n:02d}" for n in range(50)]]:
+            self.delete_sections(sections)
+            expected += len(sections)
+            with self.assertNumQueries(1):
+                deleted = get_deleted_in_gcis(self.term, course_list)
+            self.assertEqual(len(deleted), expected)
+
+
+class ChangeSummarySnapshotTests(DiffFixtureMixin, TestCase):
+    def is_stale(self, subject):
+        return ChangeSummarySnapshot.objects.get(term=self.term, subject=subject).is_stale
+
+    def test_bulk_delete_invalidates(self):
+        # CAMS is maintained by hand in the admin, which deletes querysets
+        before = get_change_summary(self.term, ["BIOL", "CHEM"])
+        only_in_cams = Cams.objects.get(course=self.biol, section="A04")
+        Cams.objects.filter(pk=only_in_cams.pk).delete()
+        self.assertTrue(self.is_stale("BIOL"))
+        self.assertFalse(self.is_stale("CHEM"))
+
+        after = get_change_summary(self.term, ["BIOL", "CHEM"])
+        self.assertNotIn(only_in_cams.pk, after.deleted_cams)
+        self.assertEqual(after.total_changes, before.total_changes - 1)
+
+        # the CHEM A02 deleted in GCIS is gone from CAMS now too
+        Cams.objects.filter(course=self.chem, section="A02").delete()
+        self.assertEqual(get_change_summary(self.term, ["CHEM"]).deleted_gcis, [])
+
+    def test_subjects_keep_their_order(self):
+        biol_a02 = Schedule.objects.get(course=self.biol, section="A02").pk
+        chem_a04 = Schedule.objects.get(course=self.chem, section="A04").pk
+        self.assertEqual(
+            get_change_summary(self.term, ["CHEM", " biol", "CHEM"]).gcis_changed,
+            [chem_a04, biol_a02],
+        )
+        self.assertEqual(
+            get_change_summary(self.term, ["BIOL", "CHEM"]).gcis_changed,
+            [biol_a02, chem_a04],
+        )
+
+    def test_invalidated_while_rebuilding(self):
+        def build():
+            # a section saved while the diff runs
+            invalidate_change_summary(self.term.pk, ["BIOL"])
+            return {"added": [1]}
+
+        value = ChangeSummarySnapshot.get_or_rebuild(build, term=self.term, subject="BIOL")
+        self.assertEqual(value, {"added": [1]})
+        self.assertTrue(self.is_stale("BIOL"))
+
+        value = ChangeSummarySnapshot.get_or_rebuild(
+            lambda: {"added": [2]}, term=self.term, subject="BIOL"
+        )
+        self.assertEqual(value, {"added": [2]})
+        self.assertFalse(self.is_stale("BIOL"))
+        self.assertEqual(
+            ChangeSummarySnapshot.get_or_rebuild(None, term=self.term, subject="BIOL"),
+            {"added": [2]},
+        )
+
+
+class MeetingPatternTests(DiffFixtureMixin, TestCase):
+    def pattern(self, model, course, section):
+        return model.objects.filter(course=course, section=section).values_list(
+            "days_mask", "start_minute", "stop_minute", "duration", "modality"
+        )[0]
+
+    def test_set_on_save(self):
+        self.assertEqual(
+            self.pattern(Schedule, self.biol, "A02"), (10, 540, 615, 75, FACE_TO_FACE)
+        )
+        self.assertEqual(
+            self.pattern(Cams, self.chem, "A01NT"), (0, 540, 615, 75, ONLINE)
+        )
+
+        schedule = Schedule.objects.get(course=self.biol, section="A01")
+        schedule.section, schedule.days, schedule.stop_time = "A01HY", "F", None
+        schedule.save()
+        self.assertEqual(
+            self.pattern(Schedule, self.biol, "A01HY"), (16, 540, None, None, HYBRID)
+        )
+
+    def test_set_on_load(self):
+        extract = StringIO(
+            "Term,Subject,Number,Section,Capacity,Instructor,Status,Campus,"
+            "Building,Room,Days,Start,Stop\n"
+            "FALL2023,BIOL,1406,B01HY,24,,OPEN,Main,LIB,102,T R,6:00 PM,7:50 PM\n"
+        )
+        CamsLoader(incremental=True).load(extract)
+        self.assertEqual(
+            self.pattern(Cams, self.biol, "B01HY"), (10, 1080, 1190, 110, HYBRID)
+        )
+
+    def test_meeting(self):
+        meeting = Schedule.objects.filter(is_deleted=False).meeting(
+            "TF", time(10, 0), time(11, 0)
+        )
+        self.assertEqual(list(meeting.values_list("section", flat=True)), ["A02"])
+
+
+class CamsExtractMixin:
+    """load_cams with small CSV extracts"""
+
+    @classmethod
+    def create_catalog(cls):
+        cls.term = Term.objects.create(year=2023, semester="FALL", active="T")
+        cls.biol = Course.objects.create(
+            subject="BIOL", number="1406", credit=4, name="Biology I"
+        )
+        cls.main = Campus.objects.create(name="Main")
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def row(self, section, **kwargs):
+        values = {
+            "Term": "FALL2023",
+            "Subject": "BIOL",
+            "Number": "1406",
+            "Section": section,
+            "Capacity": "24",
+            "Status": "OPEN",
+            "Instructor": "Smith, Jane",
+            "Campus": "Main",
+            "Building": "LIB",
+            "Room": "102",
+            "Days": "MW",
+            "Start": "09:00 AM",
+            "Stop": "10:15 AM",
+        }
+        values.update(kwargs)
+        return [values[column] for column in CAMS_CSV_COLUMNS]
+
+    def write(self, rows, name="extract.csv"):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CAMS_CSV_COLUMNS)
+            writer.writerows(rows)
+        return path
+
+    def load(self, rows, **options):
+        out, err = StringIO(), StringIO()
+        call_command("load_cams", self.write(rows), stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def sections(self):
+        return sorted(Cams.live.values_list("section", flat=True))
+
+
+class CamsLoadTests(CamsExtractMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_catalog()
+
+    def test_full_load_replaces_the_term(self):
+        self.load([self.row("A01"), self.row("A02")])
+        with self.captureOnCommitCallbacks(execute=True):
+            out, _ = self.load([self.row("A02", Capacity="30"), self.row("A03")])
+        self.assertIn("2 inserted, 0 updated, 2 deleted", out)
+        self.assertEqual(self.sections(), ["A02", "A03"])
+        self.assertEqual(Cams.live.get(section="A02").capacity, 30)
+
+    def test_full_loads_are_activated_rolled_back_and_pruned(self):
+        def live():
+            return list(Cams.live.values_list("section", flat=True))
+
+        def loads():
+            return list(
+                CamsLoad.objects.filter(term=self.term)
+                .order_by("pk")
+                .values_list("status", flat=True)
+            )
+
+        for section in ["A01", "A02", "A03"]:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.load([self.row(section)])
+        # the first load is pruned, the one before the live load is kept
+        self.assertEqual(live(), ["A03"])
+        self.assertEqual(loads(), [CamsLoad.RETIRED, CamsLoad.LIVE])
+        self.assertEqual(
+            sorted(Cams.objects.values_list("section", flat=True)), ["A02", "A03"]
+        )
+
+        out = StringIO()
+        call_command("rollback_cams", "FALL2023", stdout=out)
+        self.assertIn("previous CAMS load is live", out.getvalue())
+        self.assertEqual(live(), ["A02"])
+        call_command("rollback_cams", "FALL2023", stdout=out)
+        self.assertEqual(live(), ["A03"])
+
+        prune_cams_loads(self.term.pk, keep=0)
+        self.assertEqual(loads(), [CamsLoad.LIVE])
+        err = StringIO()
+        call_command("rollback_cams", "FALL2023", stdout=out, stderr=err)
+        self.assertIn("no previous CAMS load", err.getvalue())
+        self.assertEqual(live(), ["A03"])
+
+    def test_failed_full_load_leaves_the_live_load(self):
+        self.load([self.row("A01")])
+        live = CamsLoad.objects.get(term=self.term)
+        with self.assertRaises(CommandError):
+            self.load([self.row("A02"), self.row("A02")])
+        self.assertEqual(list(CamsLoad.objects.filter(term=self.term)), [live])
+        self.assertEqual(CamsLoad.objects.get().status, CamsLoad.LIVE)
+        self.assertEqual(self.sections(), ["A01"])
+
+    def test_loads_are_staged_before_they_go_live(self):
+        self.load([self.row("A01")])
+        with patch("scheduling.cams.activate_cams_load", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.load([self.row("A02")])
+        # committed rather than rolled back with the switch
+        staged = CamsLoad.objects.get(status=CamsLoad.LOADING)
+        self.assertEqual(
+            list(Cams.objects.filter(load=staged).values_list("section", flat=True)),
+            ["A02"],
+        )
+        self.assertEqual(self.sections(), ["A01"])
+
+    def test_incremental_load_writes_changed_rows(self):
+        self.load([self.row("A01"), self.row("A02"), self.row("A03")])
+        unchanged = Cams.live.get(section="A01")
+        snapshot = ChangeSummarySnapshot.objects.create(
+            term=self.term, subject="BIOL", is_stale=False
+        )
+
+        out, _ = self.load(
+            [self.row("A01"), self.row("A02", Days="TR"), self.row("A04")],
+            incremental=True,
+        )
+        self.assertIn("1 inserted, 1 updated, 1 deleted, 1 unchanged", out)
+        self.assertEqual(self.sections(), ["A01", "A02", "A04"])
+        self.assertEqual(Cams.live.get(section="A02").days_mask, 10)
+        self.assertEqual(Cams.live.get(section="A01").pk, unchanged.pk)
+        snapshot.refresh_from_db()
+        self.assertTrue(snapshot.is_stale)
+
+        out, _ = self.load(
+            [self.row("A01"), self.row("A02", Days="TR"), self.row("A04")],
+            incremental=True,
+        )
+        self.assertIn("0 inserted, 0 updated, 0 deleted, 3 unchanged", out)
+
+    def test_invalid_rows_load_nothing(self):
+        self.load([self.row("A01")])
+        with self.assertRaisesMessage(CommandError, "1 invalid row(s), nothing loaded"):
+            self.load([self.row("A02"), self.row("A03", Number="9999")])
+        self.assertEqual(self.sections(), ["A01"])
+
+    def test_duplicate_sections_load_nothing(self):
+        self.load([self.row("A01")])
+        with self.assertRaisesMessage(
+            CommandError, "duplicate sections in FALL2023, nothing loaded: BIOL1406 A02"
+        ):
+            self.load([self.row("A02"), self.row("a02")])
+        self.assertEqual(self.sections(), ["A01"])
+
+    @skipUnless(connection.vendor == "sqlite", "the fallback is for SQLite")
+    def test_workers_fall_back_to_a_serial_load(self):
+        _, err = self.load([self.row("A01")], workers=2)
+        self.assertIn("SQLite allows one writer at a time, loading serially.", err)
+        self.assertEqual(self.sections(), ["A01"])
+
+    def test_workers_start_only_if_the_terms_are_valid(self):
+        path = self.write([self.row("A01"), self.row("A02", Term="WINTER2023")])
+        results, rejected = load_cams_parallel(path, 2)
+        self.assertEqual(results, [])
+        self.assertEqual(
+            [(line, error) for line, _, error in rejected],
+            [(3, "invalid term 'WINTER2023'")],
+        )
+
+    def test_short_rows_are_rejected(self):
+        rows = [self.row("A01"), self.row("A02")[:5], self.row("A03") + ["extra"]]
+        with self.assertRaisesMessage(CommandError, "2 invalid row(s), nothing loaded"):
+            self.load(rows)
+        self.assertEqual(self.sections(), [])
+
+        rejects = os.path.join(self.tmp.name, "rejects.csv")
+        _, err = self.load(rows, max_rejects=2, rejects=rejects)
+        self.assertEqual(self.sections(), ["A01"])
+        missing = "missing Status, Instructor, Campus, Building, Room, Days, Start, Stop"
+        self.assertIn(f"line 3: {missing}", err)
+        self.assertIn("line 4: 1 field(s) too many", err)
+        with open(rejects, newline="") as f:
+            self.assertEqual(
+                [(line, error) for line, error, *_ in csv.reader(f)][1:],
+                [("3", missing), ("4", "1 field(s) too many")],
+            )
+
+    def test_overlong_values_are_rejected(self):
+        rows = [self.row("A01"), self.row("A02", Building="LIBRARY-EAST"), self.row("A03")]
+        _, err = self.load(rows, max_rejects=5)
+        self.assertIn(
+            "line 3: building longer than 10 characters: 'LIBRARY-EAST'", err
+        )
+        self.assertEqual(self.sections(), ["A01", "A03"])
+
+
+@skipUnless(connection.vendor == "postgresql", "--workers loads serially on SQLite")
+class ParallelCamsLoadTests(CamsExtractMixin, TransactionTestCase):
+    """the workers commit, their rows are only seen outside of a test transaction"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_catalog()
+        Term.objects.create(year=2024, semester="SPRING", active="T")
+
+    def test_a_failed_term_leaves_the_others_loaded(self):
+        rows = [
+            self.row("A01"),
+            self.row("A02", Term="SPRING2024"),
+            self.row("a02", Term="SPRING2024"),
+        ]
+        with self.assertRaisesMessage(
+            CommandError, "SPRING2024 not loaded, the other terms were loaded."
+        ):
+            self.load(rows, workers=2)
+        self.assertEqual(
+            list(Cams.live.values_list("term__semester", "section")), [("FALL", "A01")]
+        )
+
+    def test_a_worker_error_is_reported_with_its_term(self):
+        finish = CamsLoader.finish
+
+        def fail_in_spring(loader):
+            if ("SPRING", 2024) in loader.load_terms:
+                raise RuntimeError("connection lost")
+            finish(loader)
+
+        # forked workers inherit the patch
+        with patch.object(CamsLoader, "finish", fail_in_spring):
+            results, _ = load_cams_parallel(
+                self.write([self.row("A01"), self.row("A01", Term="SPRING2024")]), 2
+            )
+        self.assertEqual(
+            [(result["term"], result["error"]) for result in results],
+            [("FALL2023", None), ("SPRING2024", "RuntimeError: connection lost")],
+        )
+        self.assertEqual(
+            list(Cams.live.values_list("term__semester", "section")), [("FALL", "A01")]
+        )
+
+    def test_max_rejects_applies_per_term(self):
+        rows = [
+            self.row("A01", Capacity="x"),
+            self.row("A02"),
+            self.row("A01", Term="SPRING2024", Capacity="x"),
+            self.row("A02", Term="SPRING2024"),
+        ]
+        self.load(rows, workers=2, max_rejects=1)
+        self.assertEqual(
+            sorted(Cams.live.values_list("term__semester", "section")),
+            [("FALL", "A02"), ("SPRING", "A02")],
+        )
+
+
+class NaturalKeyResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.biol = Course.objects.create(
+            subject="BIOL", number="1406", credit=4, name="Biology I"
+        )
+        cls.main = Campus.objects.create(name="Main")
+        cls.smith = Instructor.objects.create(first_name="Jane", last_name="Smith")
+        cls.room = Location.objects.create(building="LIB", room="102")
+
+    def test_lookups(self):
+        resolver = NaturalKeyResolver()
+        self.assertEqual(resolver.course("biol 1406"), self.biol)
+        self.assertEqual(resolver.course(("BIOL", "1406")), self.biol)
+        self.assertEqual(resolver.campus("Main"), self.main)
+        self.assertIsNone(resolver.campus(""))
+        self.assertEqual(resolver.instructor(" Smith , Jane "), self.smith)
+        self.assertIsNone(resolver.instructor(""))
+        self.assertEqual(resolver.location("LIB 102"), self.room)
+        self.assertIsNone(resolver.location(""))
+
+        for lookup, key, error in [
+            (resolver.course, "BIOL1", "invalid course 'BIOL1'"),
+            (resolver.course, "CHEM1411", "unknown course CHEM1411"),
+            (resolver.campus, "South", "unknown campus South"),
+            (resolver.instructor, "Jones, Bob", "unknown instructor Jones, Bob"),
+            (resolver.location, "SCI 201", "unknown location SCI 201"),
+        ]:
+            with self.subTest(key), self.assertRaisesMessage(ValueError, error):
+                lookup(key)
+
+    def test_create_missing(self):
+        resolver = NaturalKeyResolver()
+        new = [("Bob", "Jones"), ("Jane", "Smith"), ("Bob", "Jones"), None]
+        # created rows are read back where bulk_create returns no primary keys
+        queries = 1 if connection.features.can_return_rows_from_bulk_insert else 2
+        with self.assertNumQueries(queries):
+            resolver.create_missing(instructors=new)
+        with self.assertNumQueries(0):
+            resolver.create_missing(instructors=new, locations=[("LIB", "102"), ("", "")])
+
+        jones = resolver.instructor(("Bob", "Jones"))
+        self.assertEqual(Instructor.objects.get(last_name="Jones"), jones)
+        self.assertEqual(Instructor.objects.count(), 2)
+        self.assertEqual(
+            resolver.report()["instructor"], {"hits": 1, "misses": 0, "created": 1}
+        )
+
+
+def meeting(pk, instructor, location, days, start, stop, section="A01", campus=1):
+    """CONFLICT_FIELDS and TIMETABLE_FIELDS values of a section"""
+    return {
+        "id": pk,
+        "section": section,
+        "instructor_id": instructor,
+        "location_id": location,
+        "campus_id": campus,
+        "days": days,
+        "start_time": start,
+        "stop_time": stop,
+    }
+
+
+# instructors 1-4, rooms 1-4
+MEETINGS = [
+    meeting(1, 1, 1, "MW", time(9, 0), time(10, 15)),
+    # starts when 1 ends
+    meeting(2, 1, 2, "MW", time(10, 15), time(11, 30)),
+    # inside 1 on W
+    meeting(3, 1, 1, "W", time(9, 30), time(10, 0)),
+    # same times as 1, other days
+    meeting(4, 2, 1, "TR", time(9, 0), time(10, 15)),
+    meeting(5, 2, 1, "R", time(10, 0), time(11, 0), campus=2),
+    # online, it has no room
+    meeting(6, 3, 1, "MW", time(9, 0), time(10, 15), section="A06NT"),
+    # not scheduled yet
+    meeting(7, None, None, None, None, None),
+    meeting(8, 4, 3, "MWF", time(8, 0), time(9, 0)),
+    meeting(9, 4, 4, "MF", time(8, 30), time(9, 30)),
+]
+
+
+class FindConflictsTests(SimpleTestCase):
+    def test_overlaps(self):
+        self.assertEqual(
+            find_conflicts(MEETINGS),
+            {
+                "instructor": {(1, 1, 3): "W", (2, 4, 5): "R", (4, 8, 9): "MF"},
+                "location": {(1, 1, 3): "W", (1, 4, 5): "R"},
+            },
+        )
+
+    def test_order_does_not_matter(self):
+        self.assertEqual(find_conflicts(MEETINGS[::-1]), find_conflicts(MEETINGS))
+
+
+class TimetableTests(SimpleTestCase):
+    def setUp(self):
+        self.timetable = Timetable(MEETINGS)
+
+    def test_conflicts(self):
+        timetable = self.timetable
+        self.assertEqual(len(timetable), 8)
+        window = ("W", time(9, 45), time(10, 30))
+        self.assertEqual(timetable.conflicts("instructor", 1, *window), [1, 2, 3])
+        self.assertEqual(
+            timetable.conflicts("instructor", 1, *window, exclude=3), [1, 2]
+        )
+        # days as a bitmask, times as minutes, touching is no conflict
+        self.assertEqual(timetable.conflicts("instructor", 1, 0b1, 615, 690), [2])
+        self.assertEqual(timetable.conflicts("instructor", 1, "F", 540, 615), [])
+        # the online section 6 has no room
+        self.assertEqual(timetable.conflicts("location", 1, "M", 540, 615), [1])
+        self.assertEqual(timetable.conflicts("campus", 2, "TR", 540, 1440), [5])
+        self.assertEqual(timetable.conflicts("instructor", None, "M", 0, 1440), [])
+        with self.assertRaises(ValueError):
+            timetable.conflicts("course", 1, "M", 0, 1440)
+
+    def test_is_free(self):
+        is_free = self.timetable.is_free
+        self.assertTrue(is_free("location", 1, "F", time(9, 0), time(10, 0)))
+        self.assertFalse(is_free("location", 1, "R", time(9, 0), time(10, 0)))
+        self.assertTrue(is_free("location", 2, "M", time(9, 0), time(10, 15)))
+        self.assertTrue(is_free("instructor", 5, "M", time(9, 0), time(10, 0)))
+
+    def test_occupancy_and_busy(self):
+        self.assertEqual(
+            self.timetable.occupancy("instructor", 1),
+            [(1, "MW", 540, 615), (3, "W", 570, 600), (2, "MW", 615, 690)],
+        )
+        self.assertEqual(self.timetable.occupancy("location", 5), [])
+        self.assertEqual(self.timetable.busy("location", "R", 630, 645), {1})
+        self.assertEqual(self.timetable.busy("instructor", "MWF", 510, 540), {4})
+
+
+class ScheduleFormConflictTests(DiffFixtureMixin, TestCase):
+    def get_conflicts(self, instance=None, **kwargs):
+        data = {
+            "term": self.term.pk,
+            "course": self.biol.pk,
+            "section": "A10",
+            "instructor": self.jones.pk,
+            "capacity": 24,
+            "status": "OPEN",
+            "campus": self.main.pk,
+            "location": self.room.pk,
+            "days": ["W"],
+            "start_time": "09:30 AM",
+            "stop_time": "10:00 AM",
+            "notes": "",
+        }
+        data.update(kwargs)
+        form = ScheduleForm(data, instance=instance)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.conflicts
+
+    def sections(self, conflicts):
+        return [conflict.split(" for ")[1].split(" on ")[0] for conflict in conflicts]
+
+    def test_room_and_instructor_conflicts(self):
+        # deleted sections and sections on other days are no conflicts
+        self.assertEqual(
+            self.get_conflicts(),
+            [
+                f"LIB102 is also scheduled for {section} on MW 09:00 AM-10:15 AM."
+                for section in [
+                    "BIOL1406A01", "BIOL1406A03", "BIOL1406A05", "CHEM1411A04"
+                ]
+            ],
+        )
+        self.assertEqual(
+            self.sections(self.get_conflicts(instructor=self.smith.pk, location="")),
+            ["BIOL1406A01", "BIOL1406A03", "BIOL1406A05", "CHEM1411A04"],
+        )
+        self.assertEqual(
+            self.get_conflicts(days=["T", "R"]),
+            ["LIB102 is also scheduled for BIOL1406A02 on TR 09:00 AM-10:15 AM."],
+        )
+
+    def test_no_conflicts(self):
+        # touching end to start
+        self.assertEqual(
+            self.get_conflicts(start_time="10:15 AM", stop_time="11:00 AM"), []
+        )
+        self.assertEqual(self.get_conflicts(days=[], start_time="", stop_time=""), [])
+        self.assertEqual(self.get_conflicts(instructor="", location=""), [])
+
+    def test_warnings_after_saving(self):
+        user = User.objects.create_user("coordinator")
+        self.client.force_login(user)
+        a03 = Schedule.objects.get(course=self.biol, section="A03")
+        data = {
+            "term": self.term.pk,
+            "course": self.biol.pk,
+            "section": "A03",
+            "instructor": self.jones.pk,
+            "capacity": 24,
+            "status": "OPEN",
+            "campus": self.main.pk,
+            "location": self.room.pk,
+            "days": ["T"],
+            "start_time": "09:30 AM",
+            "stop_time": "10:00 AM",
+            "notes": "",
+            "next": reverse("recent"),
+        }
+        response = self.client.post(reverse("edit_schedule", args=[a03.pk]), data)
+        self.assertRedirects(response, reverse("recent"), fetch_redirect_response=False)
+        self.assertEqual(
+            [(m.level_tag, m.message) for m in get_messages(response.wsgi_request)],
+            [
+                ("success", f"BIOL1406A03-{self.term} updated."),
+                (
+                    "warning",
+                    "LIB102 is also scheduled for BIOL1406A02 on TR 09:00 AM-10:15 AM.",
+                ),
+            ],
+        )
+
+    def test_edited_section_is_no_conflict(self):
+        a01 = Schedule.objects.get(course=self.biol, section="A01")
+        self.assertEqual(
+            self.sections(self.get_conflicts(instance=a01, section="A01")),
+            ["BIOL1406A03", "BIOL1406A05", "CHEM1411A04"],
+        )
+
+    def post(self, view, schedule, **kwargs):
+        data = {
+            "term": self.term.pk,
+            "course": schedule.course.pk,
+            "section": schedule.section,
+            "instructor": schedule.instructor.pk,
+            "capacity": schedule.capacity,
+            "status": schedule.status,
+            "campus": schedule.campus.pk,
+            "location": schedule.location.pk,
+            "days": list(schedule.days),
+            "start_time": f"{schedule.start_time:%I:%M %p}",
+            "stop_time": f"{schedule.stop_time:%I:%M %p}",
+            "notes": "",
+            "next": reverse("recent"),
+        }
+        data.update(kwargs)
+        return self.client.post(reverse(view, args=[schedule.pk]), data)
+
+    def test_duplicate_is_no_conflict_with_its_source(self):
+        self.client.force_login(User.objects.create_user("coordinator"))
+        a01 = Schedule.objects.get(course=self.biol, section="A01")
+        response = self.post("duplicate_schedule", a01, section="A06")
+        self.assertEqual(
+            [
+                self.sections([m.message])[0]
+                for m in get_messages(response.wsgi_request)
+                if m.level_tag == "warning"
+            ],
+            ["BIOL1406A03", "BIOL1406A05", "CHEM1411A04"] * 2,
+        )
+
+    def test_no_conflicts_on_delete_and_restore(self):
+        self.client.force_login(User.objects.create_user("coordinator"))
+        a01 = Schedule.objects.get(course=self.biol, section="A01")
+        with patch.object(ScheduleForm, "find_conflicts") as find_conflicts:
+            self.post("delete_schedule", a01)
+            self.assertTrue(Schedule.objects.get(pk=a01.pk).is_deleted)
+            self.post("restore_schedule", a01)
+            self.assertFalse(Schedule.objects.get(pk=a01.pk).is_deleted)
+        find_conflicts.assert_not_called()
+
+
+class RoomOccupancyTests(SimpleTestCase):
+    def setUp(self):
+        self.rooms = [Location(pk=pk, building="LIB", room=f"10{pk}") for pk in range(1, 6)]
+        # location, campus, days (M = 1, W = 4), start, stop, capacity
+        self.occupancy = RoomOccupancy(
+            *zip(
+                (1, 1, 1, 540, 615, 30),
+                (2, 1, 1, 480, 530, 24),
+                (2, 1, 1, 700, 760, 24),
+                (3, 2, 4, 540, 615, 40),
+                (4, 1, 1, 615, 700, 20),
+            )
+        )
+
+    def free_rooms(self, **kwargs):
+        return [
+            (str(room["location"]), room["seats"], room["before"], room["after"])
+            for room in self.occupancy.free_rooms(
+                self.rooms, "M", time(9, 0), time(10, 15), **kwargs
+            )
+        ]
+
+    def test_smallest_gaps_first(self):
+        self.assertEqual(
+            self.free_rooms(),
+            [
+                ("LIB102", 24, 10, 85),
+                ("LIB104", 20, 540, 0),
+                # meets on W only
+                ("LIB103", 40, 540, 825),
+                # no sections this term
+                ("LIB105", None, 540, 825),
+            ],
+        )
+
+    def test_rooms_large_enough_first(self):
+        self.assertEqual(
+            [room for room, *_ in self.free_rooms(capacity=25)],
+            ["LIB103", "LIB102", "LIB104", "LIB105"],
+        )
+        self.assertEqual(
+            [room for room, *_ in self.free_rooms(capacity=20)],
+            ["LIB104", "LIB102", "LIB103", "LIB105"],
+        )
+
+    def test_campus(self):
+        self.assertEqual(
+            [room for room, *_ in self.free_rooms(campus=Campus(pk=1))],
+            ["LIB102", "LIB104"],
+        )
+
+    def test_round_trip(self):
+        copy = RoomOccupancy.from_dict(self.occupancy.to_dict())
+        self.assertEqual(copy.to_dict(), self.occupancy.to_dict())
+
+
+class FreeRoomsViewTests(DiffFixtureMixin, TestCase):
+    def test_saving_a_section_updates_the_free_rooms(self):
+        user = User.objects.create_user("coordinator")
+        self.client.force_login(user)
+        Location.objects.create(building="SCI", room="201")
+        url = (
+            f"{reverse('free_rooms')}?term={self.term.pk}&days=R"
+            "&start_time=10:30 AM&stop_time=11:00 AM"
+        )
+
+        def free_rooms():
+            response = self.client.get(url)
+            return [
+                (str(room["location"]), room["before"])
+                for room in response.context["room_list"]
+            ]
+
+        # BIOL A02 meets TR until 10:15 in LIB102
+        self.assertEqual(free_rooms(), [("LIB102", 15), ("SCI201", 630)])
+        a02 = Schedule.objects.get(course=self.biol, section="A02")
+        a02.stop_time = time(10, 45)
+        a02.save()
+        self.assertEqual(free_rooms(), [("SCI201", 630)])
+
+
+class SearchByTimeTests(DiffFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.north = Campus.objects.create(name="North")
+        math = Course.objects.create(subject="MATH", number="1314", credit=3, name="Algebra")
+        for course, section, days, start, stop, campus in [
+            (cls.chem, "N01", "MW", time(10, 0), time(11, 0), cls.north),
+            (cls.biol, "E01", "S", time(18, 0), time(19, 0), cls.main),
+            # not a subject of the profile
+            (math, "A01", "MW", time(9, 0), time(10, 15), cls.main),
+        ]:
+            Schedule.objects.create(
+                term=cls.term,
+                course=course,
+                section=section,
+                capacity=24,
+                campus=campus,
+                days=days,
+                start_time=start,
+                stop_time=stop,
+            )
+        cls.user = User.objects.create_user("coordinator")
+        cls.user.profile.subjects = "BIOL,CHEM"
+        cls.user.profile.save()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, start, stop, days="", campus=None):
+        params = {
+            "term": self.term.pk,
+            "days": list(days),
+            "start_time": start,
+            "stop_time": stop,
+        }
+        if campus:
+            params["campus"] = campus.pk
+        response = self.client.get(reverse("search"), params)
+        return [str(schedule) for schedule in response.context["schedule_list"]]
+
+    def test_days_share_a_bit(self):
+        # the MW sections, not BIOL A02 on TR
+        self.assertEqual(
+            self.search("09:00 AM", "09:30 AM", "W"),
+            ["BIOL1406A01", "BIOL1406A03", "BIOL1406A05", "CHEM1411A04"],
+        )
+        self.assertEqual(self.search("09:00 AM", "09:30 AM", "T"), ["BIOL1406A02"])
+        self.assertEqual(self.search("09:00 AM", "09:30 AM", "FU"), [])
+
+    def test_window_edges(self):
+        # sections ending when the window starts or starting when it ends
+        self.assertEqual(self.search("10:15 AM", "11:00 AM", "MW"), ["CHEM1411N01"])
+        self.assertEqual(self.search("08:00 AM", "09:00 AM", "MW"), [])
+        self.assertEqual(
+            self.search("10:14 AM", "10:15 AM", "M"),
+            ["BIOL1406A01", "BIOL1406A03", "BIOL1406A05", "CHEM1411A04", "CHEM1411N01"],
+        )
+
+    def test_campus(self):
+        self.assertEqual(
+            self.search("08:00 AM", "10:00 PM", "MW", self.north), ["CHEM1411N01"]
+        )
+
+    def test_no_days_is_every_day(self):
+        # ordered by start time, CHEM A01NT has no days
+        self.assertEqual(
+            self.search("08:00 AM", "10:00 PM"),
+            [
+                "BIOL1406A01",
+                "BIOL1406A02",
+                "BIOL1406A03",
+                "BIOL1406A05",
+                "CHEM1411A04",
+                "CHEM1411N01",
+                "BIOL1406E01",
+            ],
+        )
+
+    def test_invalid_window(self):
+        response = self.client.get(
+            reverse("search"),
+            {"term": self.term.pk, "start_time": "10:00 AM", "stop_time": "09:00 AM"},
+        )
+        self.assertEqual(list(response.context["schedule_list"]), [])
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["Invalid days, times or campus."],
+        )
+
+
+class ConflictReportTests(DiffFixtureMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("coordinator")
+        self.user.profile.subjects = "CHEM"
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def conflict_lists(self, query=""):
+        url = reverse("conflict_report", args=[str(self.term)]) + query
+        response = self.client.get(url)
+        return {
+            title: (
+                count,
+                [
+                    (str(resource), days, str(a), str(b))
+                    for resource, days, a, b in conflict_list
+                ],
+            )
+            for title, count, conflict_list in response.context["conflict_lists"]
+        }
+
+    def test_all_departments(self):
+        # the deleted CHEM A02 and A03 and the online CHEM A01NT are left out
+        pairs = [
+            ("BIOL1406A01", "BIOL1406A03"),
+            ("BIOL1406A01", "BIOL1406A05"),
+            ("BIOL1406A01", "CHEM1411A04"),
+            ("BIOL1406A03", "BIOL1406A05"),
+            ("BIOL1406A03", "CHEM1411A04"),
+            ("BIOL1406A05", "CHEM1411A04"),
+        ]
+        self.assertEqual(
+            self.conflict_lists(),
+            {
+                "Instructor": (6, [("Smith, Jane", "MW", a, b) for a, b in pairs]),
+                "Room": (6, [("LIB102", "MW", a, b) for a, b in pairs]),
+            },
+        )
+
+    def test_mine(self):
+        # only the pairs with a CHEM section
+        pairs = [
+            ("BIOL1406A01", "CHEM1411A04"),
+            ("BIOL1406A03", "CHEM1411A04"),
+            ("BIOL1406A05", "CHEM1411A04"),
+        ]
+        self.assertEqual(
+            self.conflict_lists("?mine=1"),
+            {
+                "Instructor": (3, [("Smith, Jane", "MW", a, b) for a, b in pairs]),
+                "Room": (3, [("LIB102", "MW", a, b) for a, b in pairs]),
+            },
+        )
+
+    def test_mine_without_subjects(self):
+        self.user.profile.subjects = ""
+        self.user.profile.save()
+        self.assertEqual(
+            self.conflict_lists("?mine=1"), {"Instructor": (0, []), "Room": (0, [])}
+        )
+
+    @patch("scheduling.views.MAX_NUMBER_OF_CONFLICTS", 2)
+    def test_limit(self):
+        url = reverse("conflict_report", args=[str(self.term)])
+        response = self.client.get(url)
+        self.assertEqual(response.context["max_number_of_conflicts"], 2)
+        self.assertEqual(
+            self.conflict_lists()["Room"],
+            (
+                6,
+                [
+                    ("LIB102", "MW", "BIOL1406A01", "BIOL1406A03"),
+                    ("LIB102", "MW", "BIOL1406A01", "BIOL1406A05"),
+                ],
+            ),
+        )
+        self.assertContains(response, "Showing the first 2 of 6 conflicts.", count=2)
+
+
+class ChangeSummaryCsvTests(DiffFixtureMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user("coordinator")
+        user.profile.subjects = "BIOL,CHEM"
+        user.profile.save()
+        self.client.force_login(user)
+
+    def test_same_lines_as_before_streaming(self):
+        response = self.client.get(
+            reverse("download_change_summary_by_term", args=[str(self.term)])
+        )
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+
+        # as written by csv.writer(response) before the export was streamed
+        self.assertEqual(
+            rows[0],
+            [
+                "Term",
+                "Course",
+                "Section",
+                "Name",
+                "Status",
+                "Capacity",
+                "Instructor",
+                "Campus",
+                "Location",
+                "Days",
+                "Start",
+                "Stop",
+                "Note",
+                "source",
+                "Inserted_by",
+                "Inserted_date",
+                "Updated_by",
+                "Updated_date",
+                "Deleted_by",
+                "Deleted_date",
+                "Action",
+            ],
+        )
+        self.assertIn(
+            [
+                "FALL2023",
+                "BIOL1406",
+                "A04",
+                "Biology I",
+                "OPEN",
+                "24",
+                "Smith, Jane",
+                "Main",
+                "LIB102",
+                "MW",
+                "09:00:00",
+                "10:15:00",
+                "",
+                "CAMS",
+                "",
+                "",
+                "",
+                "",
+                "",
+                "",
+                "DELETE (in-cams-only)",
+            ],
+            rows,
+        )
+        self.assertEqual(
+            [row[-1] for row in rows[1:]],
+            ["CHANGE"] * 4 + ["DELETE"] + ["DELETE (in-cams-only)"] * 2 + ["ADD"],
+        )
+
+
+class ScheduleSummarySnapshotTests(DiffFixtureMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user("coordinator")
+        user.profile.subjects = "BIOL,CHEM"
+        user.profile.save()
+        self.client.force_login(user)
+        self.url = reverse("schedule_summary_by_term", args=[str(self.term)])
+
+    def room_conflicts(self):
+        response = self.client.get(self.url)
+        conflict_list = response.context["location_conflict_list"] or []
+        return [
+            (str(resource), str(a), str(b))
+            for column in conflict_list
+            for resource, _, a, b in column
+        ]
+
+    def test_deleting_a_section(self):
+        self.assertEqual(len(self.room_conflicts()), 6)
+        self.client.get(
+            reverse("free_rooms"),
+            {"term": self.term.pk, "days": "M", "start_time": "09:00 AM", "stop_time": "10:00 AM"},
+        )
+        self.assertFalse(RoomOccupancySnapshot.objects.get(term=self.term).is_stale)
+        Schedule.objects.get(course=self.chem, section="A04").delete()
+        self.assertTrue(
+            all(ScheduleSummarySnapshot.objects.values_list("is_stale", flat=True))
+        )
+        self.assertTrue(RoomOccupancySnapshot.objects.get(term=self.term).is_stale)
+        self.assertEqual(
+            self.room_conflicts(),
+            [
+                ("LIB102", "BIOL1406A01", "BIOL1406A03"),
+                ("LIB102", "BIOL1406A01", "BIOL1406A05"),
+                ("LIB102", "BIOL1406A03", "BIOL1406A05"),
+            ],
+        )
+
+    def test_deleted_while_cached(self):
+        self.assertEqual(len(self.room_conflicts()), 6)
+        # the cached summary still has it
+        delete_without_signals(Schedule.objects.filter(course=self.chem, section="A04"))
+        self.assertFalse(ScheduleSummarySnapshot.objects.get().is_stale)
+        self.assertEqual(
+            self.room_conflicts(),
+            [
+                ("LIB102", "BIOL1406A01", "BIOL1406A03"),
+                ("LIB102", "BIOL1406A01", "BIOL1406A05"),
+                ("LIB102", "BIOL1406A03", "BIOL1406A05"),
+            ],
+        )
+
+    def test_deleting_an_instructor(self):
+        self.assertEqual(len(self.room_conflicts()), 6)
+        get_change_summary(self.term, ["BIOL", "CHEM"])
+        # renaming needs no rebuild, names are read when shown
+        self.smith.last_name = "Smyth"
+        self.smith.save()
+        self.assertFalse(ScheduleSummarySnapshot.objects.get().is_stale)
+
+        # sections of the instructor are set to NULL without signals
+        self.smith.delete()
+        self.assertTrue(ScheduleSummarySnapshot.objects.get().is_stale)
+        self.assertTrue(
+            all(ChangeSummarySnapshot.objects.values_list("is_stale", flat=True))
+        )
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context["instructor_conflict_list"])
+
+
+class GenerateCollegeTests(TestCase):
+    def generate(self, **options):
+        call_command(
+            "generate_college",
+            terms=2,
+            subjects=1,
+            courses_per_subject=2,
+            sections_per_course=3,
+            instructors=3,
+            rooms=3,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_generating_again_needs_clear(self):
+        self.generate()
+        counts = (Schedule.objects.count(), Cams.objects.count())
+        with self.assertRaisesMessage(
+            CommandError,
+            "FALL2023, SPRING2024 already have sections, use --clear to replace them.",
+        ):
+            self.generate()
+        self.assertEqual((Schedule.objects.count(), Cams.objects.count()), counts)
+
+        self.generate(clear=True)
+        self.assertEqual((Schedule.objects.count(), Cams.objects.count()), counts)
+
+
+class SchedulingQueryBudgetTests(QueryBudgetMixin, TestCase):
+    urlconf = "scheduling.urls"
+    BUDGETS = {
+        "scheduling_home": 13,
+        "update_subjects": 6,
+        "search (subject)": 8,
+        "search (course)": 9,
+        "search (instructor)": 9,
+        "search (time)": 10,
+        "add_new_schedule": 11,
+        "duplicate_schedule": 10,
+        "edit_schedule": 9,
+        "delete_schedule": 9,
+        "restore_schedule": 9,
+        "recent": 9,
+        "change_summary": 6,
+        "change_summary_by_term": 31,
+        "download_change_summary_by_term": 31,
+        "schedule_summary": 6,
+        "schedule_summary_by_term": 20,
+        "conflict_report": 13,
+        "free_rooms": 12,
+        "deleted_schedules": 7,
+    }
+    QUERY_STRINGS = {
+        "search (subject)": "?term={term_pk}&subject={subject}",
+        "search (course)": "?term={term_pk}&course={crs_pk}",
+        "search (instructor)": "?term={term_pk}&instructor={instructor_pk}",
+        "search (time)": "?term={term_pk}&start_time=07:00+AM"
+        "&stop_time=10:00+PM&campus={campus_pk}",
+        "conflict_report": "?mine=1",
+        "free_rooms": "?term={term_pk}&days=M&days=W&start_time=07:00+AM"
+        "&stop_time=07:45+AM",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("coordinator")
+        Dates.objects.create(cams_update_at=timezone.now())
+
+    def seed(self, size):
+        call_command(
+            "generate_college",
+            subjects=2,
+            courses_per_subject=3,
+            sections_per_course=size * 4,
+            instructors=3,
+            rooms=3,
+            drift=0.3,
+            soft_delete_rate=0.2,
+            clear=True,
+            stdout=StringIO(),
+        )
+        self.term = Term.objects.get(year=2023, semester="FALL")
+        schedules = Schedule.objects.filter(term=self.term).order_by("pk")
+        ids = list(schedules.values_list("pk", flat=True))
+        # recent shows what the user added, edited and deleted
+        schedules.update(insert_by=self.user)
+        schedules.filter(pk__in=ids[::2]).update(update_by=self.user)
+        schedules.filter(is_deleted=True).update(deleted_by=self.user)
+
+        subjects = sorted(set(Course.objects.values_list("subject", flat=True)))
+        self.user.profile.subjects = ",".join(subjects)
+        self.user.profile.save()
+
+        schedule = schedules.filter(is_deleted=False).first()
+        self.url_kwargs = {
+            "term_pk": self.term.pk,
+            "crs_pk": schedule.course_id,
+            "pk": schedule.pk,
+            "term": "FALL2023",
+            "subject": subjects[0],
+            "instructor_pk": schedule.instructor_id,
+            "campus_pk": schedule.campus_id,
+        }
+
+    def reset_caches(self):
+        invalidate_change_summary(self.term.pk)
+        invalidate_room_occupancy([self.term.pk])
+        invalidate_schedule_summary([self.term.pk])
@@ -35,5 +35,7 @@ urlpatterns = [
         views.schedule_summary_by_term,
         name="schedule_summary_by_term",
     ),
+    path("conflicts/<term>/", views.conflict_report, name="conflict_report"),
+    path("rooms/free/", views.free_rooms, name="free_rooms"),
     path("deleted-schedules/", views.deleted_schedules, name="deleted_schedules"),
 ]
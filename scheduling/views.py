@@ -4,21 +4,37 @@ from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse
-from django.db.models import Count
 
-import pandas as pd
-import numpy as np
 import csv
 from zoneinfo import ZoneInfo
 
-from .forms import ScheduleForm, SubjectForm, SearchForm, SearchBySubjectForm, SUBJECTS
-from .models import Course, Dates, Schedule, Instructor, Term, Cams
+from .diff import (
+    diff_gcis_cams,
+    get_change_summary,
+    hydrate_diff,
+    iter_hydrate,
+)
+from .conflicts import CONFLICT_FIELDS, find_conflicts
+from .forms import (
+    FreeRoomForm,
+    ScheduleForm,
+    SubjectForm,
+    SearchForm,
+    SearchBySubjectForm,
+    SearchByTimeForm,
+    SUBJECTS,
+)
+from .models import Course, Dates, Schedule, Instructor, Location, Term, Cams
+from .rooms import get_room_occupancy
+from .summary import get_schedule_summary
 from main.models import Profile
 
 ITEMS_PER_COLUMN = 10
 MAX_NUMBER_OF_DELETED_ITEMS = 8
+MAX_NUMBER_OF_CONFLICTS = 200
+
 
 def list_to_lol(items, items_per_list=10):
     """convert list to a list of list, with items_per_list for each"""
@@ -27,6 +43,7 @@ def list_to_lol(items, items_per_list=10):
     return [items[(i*items_per_list):min(len(items), (i+1)*items_per_list)] for i in range(len(items)//items_per_list+1)]
 
 
+
 # ------------------------ Home --------------------------#
 @login_required
 def home(request):
@@ -78,8 +95,12 @@ def home(request):
     form.fields["term"].queryset = Term.objects.filter(active="T")
     form.fields["course"].queryset = course_list
 
+    form2 = SearchByTimeForm()
+    form2.fields["term"].queryset = Term.objects.filter(active="T")
+
     context["form"] = form
     context["form1"] = form1
+    context["form2"] = form2
 
     return render(request, "scheduling/home.html", context)
 
@@ -87,6 +108,7 @@ def home(request):
 @login_required
 def search(request):
     # scheduling/schedules/search/?term=1&course=1&section=A01&page=1
+    # scheduling/schedules/search/?term=1&days=T&days=R&start_time=09:00+AM&stop_time=11:00+AM&campus=1
 
     profile = get_object_or_404(Profile, user=request.user)
     if profile.subjects:
@@ -113,7 +135,7 @@ def search(request):
         hide_add_button = True
         show_course = True
         subject_only = True
-        schedule_list = Schedule.objects.filter(
+        schedule_list = Schedule.objects.with_related().filter(
             term=term, course__subject=subject, is_deleted=False
         ).order_by("course", "section")
     
@@ -125,7 +147,7 @@ def search(request):
         context["course"] = course
         context["section"] = section
 
-        schedule_list = Schedule.objects.filter(term=term, course=course, is_deleted=False)
+        schedule_list = Schedule.objects.with_related().filter(term=term, course=course, is_deleted=False)
         if section:
             schedule_list = schedule_list.filter(section=section)
 
@@ -133,15 +155,35 @@ def search(request):
         context["instructor_pk"] = instructor_pk
         try:
             instructor = Instructor.objects.get(pk=instructor_pk)
-            schedule_list = Schedule.objects.filter(
+            schedule_list = Schedule.objects.with_related().filter(
                 term=term, instructor=instructor, course__subject__in=subject_list, is_deleted=False
             ).order_by("course", "section")
         except Instructor.DoesNotExist:
-            schedule_list = Schedule.objects.filter(
+            schedule_list = Schedule.objects.with_related().filter(
                 term=term, instructor__isnull=True, course__subject__in=subject_list, is_deleted=False
             ).order_by("course", "section")
         hide_add_button = True
         show_course = True
+
+    if request.GET.get("start_time"):
+        # sections of the profile's subjects meeting in a time window
+        hide_add_button = True
+        show_course = True
+        form = SearchByTimeForm(request.GET)
+        if form.is_valid():
+            window = form.cleaned_data
+            context["window"] = window
+            schedule_list = (
+                Schedule.objects.with_related()
+                .filter(term=term, course__subject__in=subject_list, is_deleted=False)
+                .meeting(window["days"], window["start_time"], window["stop_time"])
+                .order_by("start_minute", "course", "section")
+            )
+            if window["campus"]:
+                schedule_list = schedule_list.filter(campus=window["campus"])
+        else:
+            messages.error(request, "Invalid days, times or campus.")
+            schedule_list = Schedule.objects.none()
     context["hide_add_button"] = hide_add_button
     context["show_course"] = show_course
     context["subject_only"] = subject_only
@@ -211,7 +253,7 @@ def courses_with_term(request, term):
 @login_required
 def duplicate_schedule(request, pk):
 
-    schedule = get_object_or_404(Schedule, pk=pk)
+    schedule = get_object_or_404(Schedule.objects.with_related(), pk=pk)
     new_schedule = schedule
     new_schedule.pk = None
     if new_schedule.days:
@@ -224,7 +266,7 @@ def duplicate_schedule(request, pk):
     form = ScheduleForm(instance=new_schedule)
 
     if request.method == "POST":
-        form = ScheduleForm(request.POST, instance=new_schedule)
+        form = ScheduleForm(request.POST, instance=new_schedule, source_pk=pk)
 
         if form.is_valid():
             schedule = form.save(commit=False)
@@ -233,6 +275,8 @@ def duplicate_schedule(request, pk):
             term_pk = schedule.term.id
             schedule.save()
             messages.success(request, f"{schedule}-{schedule.term} added.")
+            for conflict in form.conflicts:
+                messages.warning(request, conflict)
             prev_url = request.POST.get("next")
             return HttpResponseRedirect(prev_url)
         else:
@@ -266,6 +310,8 @@ def add_new_schedule(request, term_pk, crs_pk):
             schedule.insert_by = request.user
             schedule.save()
             messages.success(request, f"{schedule}-{schedule.term} added.")
+            for conflict in form.conflicts:
+                messages.warning(request, conflict)
             prev_url = request.POST.get("next")
             return HttpResponseRedirect(prev_url)
         else:
@@ -282,7 +328,7 @@ def add_new_schedule(request, term_pk, crs_pk):
 @login_required
 def edit_schedule(request, pk):
 
-    schedule = get_object_or_404(Schedule, pk=pk)
+    schedule = get_object_or_404(Schedule.objects.with_related(), pk=pk)
 
     if schedule.days:
         schedule.days = list(schedule.days)
@@ -299,6 +345,8 @@ def edit_schedule(request, pk):
             schedule.update_by = request.user
             schedule.save()
             messages.success(request, f"{schedule}-{schedule.term} updated.")
+            for conflict in form.conflicts:
+                messages.warning(request, conflict)
             prev_url = request.POST.get("next")
             return HttpResponseRedirect(prev_url)
         else:
@@ -316,7 +364,7 @@ def delete_schedule(request, pk):
 
     context = {}
 
-    schedule = get_object_or_404(Schedule, pk=pk)
+    schedule = get_object_or_404(Schedule.objects.with_related(), pk=pk)
     if schedule.days:
         schedule.days = list(schedule.days)
     else:
@@ -329,7 +377,8 @@ def delete_schedule(request, pk):
         form.fields[field_name].disabled = True
 
     if request.method == "POST":
-        form = ScheduleForm(request.POST, instance=schedule)
+        # the conflict warnings are never shown here
+        form = ScheduleForm(request.POST, instance=schedule, check_conflicts=False)
         for field_name, _ in form.fields.items():
             form.fields[field_name].disabled = True
         if form.is_valid():
@@ -345,7 +394,7 @@ def delete_schedule(request, pk):
 def restore_schedule(request, pk):
 
     context = {}
-    schedule = get_object_or_404(Schedule, pk=pk)
+    schedule = get_object_or_404(Schedule.objects.with_related(), pk=pk)
 
     if schedule.days:
         schedule.days = list(schedule.days)
@@ -359,7 +408,8 @@ def restore_schedule(request, pk):
         form.fields[field_name].disabled = True
 
     if request.method == "POST":
-        form = ScheduleForm(request.POST, instance=schedule)
+        # the conflict warnings are never shown here
+        form = ScheduleForm(request.POST, instance=schedule, check_conflicts=False)
         for field_name, _ in form.fields.items():
             form.fields[field_name].disabled = True
         if form.is_valid():
@@ -373,6 +423,35 @@ def restore_schedule(request, pk):
     return render(request, "scheduling/restore_schedule.html", context)
 
 
+@login_required
+def free_rooms(request):
+    # scheduling/rooms/free/?term=1&days=M&days=W&start_time=9:00 AM&stop_time=10:15 AM
+    context = {}
+
+    form = FreeRoomForm(request.GET or None)
+    context["form"] = form
+
+    if form.is_valid():
+        data = form.cleaned_data
+        locations = Location.objects.exclude(building="Inter", room="net")
+        if data["building"]:
+            locations = locations.filter(building__iexact=data["building"])
+        occupancy = get_room_occupancy(data["term"])
+        context["room_list"] = occupancy.free_rooms(
+            locations.order_by("building", "room"),
+            data["days"],
+            data["start_time"],
+            data["stop_time"],
+            data["campus"],
+            data["capacity"],
+        )
+    else:
+        for field_name, _ in form.errors.items():
+            form.fields[field_name].widget.attrs["class"] += " is-invalid"
+
+    return render(request, "scheduling/free_rooms.html", context)
+
+
 @login_required
 def schedule_summary(request):
 
@@ -380,6 +459,40 @@ def schedule_summary(request):
     return render(request, "scheduling/schedule_summary.html", {"curr_terms": curr_terms})
 
 
+def get_conflict_list(overlaps, model, limit=None):
+    """[(resource, days, schedule, other schedule)] of find_overlaps() results
+
+    Sorted by resource, only the first limit conflicts are loaded. Conflicts
+    of resources or sections deleted since a cached summary are skipped.
+    """
+    resources = model.objects.in_bulk({resource_id for resource_id, _, _ in overlaps})
+    names = {pk: str(resource) for pk, resource in resources.items()}
+    keys = sorted(
+        (key for key in overlaps if key[0] in names),
+        key=lambda key: (names[key[0]], key[1], key[2]),
+    )
+    keys = keys[:limit]
+    schedules = Schedule.objects.with_related().in_bulk(
+        {pk for _, a, b in keys for pk in (a, b)}
+    )
+    return [
+        (resources[resource_id], overlaps[resource_id, a, b], schedules[a], schedules[b])
+        for resource_id, a, b in keys
+        if a in schedules and b in schedules
+    ]
+
+
+def with_num_sections(model, counts):
+    """instances of [(pk, sections)] with a num_sections attribute, in order"""
+    objs = model.objects.in_bulk([pk for pk, _ in counts])
+    found = []
+    for pk, num_sections in counts:
+        if pk in objs:
+            objs[pk].num_sections = num_sections
+            found.append(objs[pk])
+    return found
+
+
 @login_required
 def schedule_summary_by_term(request, term):
 
@@ -392,55 +505,43 @@ def schedule_summary_by_term(request, term):
         subject_list = profile.subjects.split(",")
     else:
         subject_list = []
-    course_list = Course.objects.filter(subject__in=subject_list)
 
     year = int(term[-4:])
     semester = term[:-4].upper()
     term = get_object_or_404(Term, year__exact=year, semester__exact=semester)
-    schedules = Schedule.objects.filter(term=term, course__in=course_list)
     context["term"] = term
 
-    count_by_course = Course.objects.filter(schedule__term=term, schedule__course__in=course_list).annotate(num_sections=Count("schedule")).order_by("-num_sections")
-    if count_by_course.count() < 1:
+    summary = get_schedule_summary(term, subject_list)
+
+    count_by_course = with_num_sections(Course, summary["courses"])
+    if not count_by_course:
         context['count_by_course_list'] = None
     else:
         context['count_by_course_list'] = list_to_lol(count_by_course, ITEMS_PER_COLUMN)
 
-    count_by_instructor = Instructor.objects.filter(schedule__term=term, schedule__course__in=course_list).annotate(num_sections=Count("schedule")).order_by("-num_sections")
-    if count_by_instructor.count() < 1:
+    count_by_instructor = with_num_sections(Instructor, summary["instructors"])
+    if not count_by_instructor:
         context['count_by_instructor_list'] = None
     else:
         context['count_by_instructor_list'] = list_to_lol(count_by_instructor, ITEMS_PER_COLUMN)
 
-    instructor_not_assigned_count = schedules.filter(instructor__isnull=True).count()
-    context['instructor_not_assigned_count'] = instructor_not_assigned_count
-
-    # schedules grouped by instructor and start time
-    schedules_by_instructor_start = defaultdict(set)
-    # schedules grouped by location and start time
-    schedules_by_location_start = defaultdict(set)
-    for s in schedules:
-        for d in "MTWRFSU":
-            if s.days and d in list(s.days):
-                schedules_by_instructor_start[(s.instructor, d, s.start_time)].add(s)
-                if "NT" not in s.section:
-                    schedules_by_location_start[(s.location, d, s.start_time)].add(s)
-
-    count_by_instructor_start = [(key, sections) for key, sections in schedules_by_instructor_start.items() if len(sections) > 1 and all(key)]
-    if not count_by_instructor_start:
-        context['count_by_instructor_start_list'] = None
-    else:
-        count_by_instructor_start_list = list_to_lol(count_by_instructor_start, ITEMS_PER_COLUMN)
-        context['count_by_instructor_start_list'] = count_by_instructor_start_list
-        
+    context['instructor_not_assigned_count'] = summary["not_assigned"]
 
+    conflicts = {
+        resource: {(resource_id, a, b): days for resource_id, a, b, days in overlaps}
+        for resource, overlaps in summary["conflicts"].items()
+    }
+    instructor_conflicts = get_conflict_list(conflicts["instructor"], Instructor)
+    if not instructor_conflicts:
+        context['instructor_conflict_list'] = None
+    else:
+        context['instructor_conflict_list'] = list_to_lol(instructor_conflicts, ITEMS_PER_COLUMN)
 
-    count_by_location_start = [(key, sections) for key, sections in schedules_by_location_start.items() if len(sections) > 1 and all(key)]
-    if not count_by_instructor_start:
-        context['count_by_location_start_list'] = None
+    location_conflicts = get_conflict_list(conflicts["location"], Location)
+    if not location_conflicts:
+        context['location_conflict_list'] = None
     else:
-        count_by_location_start_list = list_to_lol(count_by_location_start, ITEMS_PER_COLUMN)
-        context['count_by_location_start_list'] = count_by_location_start_list
+        context['location_conflict_list'] = list_to_lol(location_conflicts, ITEMS_PER_COLUMN)
 
     return render(request, "scheduling/schedule_summary_by_term.html", context)
 
@@ -457,25 +558,22 @@ def recent(request):
 
     course_list = Course.objects.filter(subject__in=subject_list)
 
-    latest_edited = Schedule.objects.filter(
+    latest_edited = Schedule.objects.with_related().filter(
         update_by=request.user, course__in=course_list
     ).exclude(deleted_by=request.user)
-    n_edited = min(len(latest_edited), MAX_NUMBER_OF_DELETED_ITEMS)
-    latest_edited = latest_edited.order_by("-update_date")[:n_edited]
+    latest_edited = latest_edited.order_by("-update_date")[:MAX_NUMBER_OF_DELETED_ITEMS]
     context["latest_edited"] = latest_edited
 
-    latest_added = Schedule.objects.filter(
+    latest_added = Schedule.objects.with_related().filter(
         insert_by=request.user, course__in=course_list
     ).exclude(update_by=request.user).exclude(deleted_by=request.user)
-    n_added = min(len(latest_added), MAX_NUMBER_OF_DELETED_ITEMS)
-    latest_added = latest_added.order_by("-insert_date")[:n_added]
+    latest_added = latest_added.order_by("-insert_date")[:MAX_NUMBER_OF_DELETED_ITEMS]
     context["latest_added"] = latest_added
 
-    latest_deleted = Schedule.objects.filter(
+    latest_deleted = Schedule.objects.with_related().filter(
         is_deleted=True, deleted_by=request.user, course__in=course_list
     )
-    n_deleted = min(len(latest_deleted), MAX_NUMBER_OF_DELETED_ITEMS)
-    latest_deleted = latest_deleted.order_by("-deleted_at")[:n_deleted]
+    latest_deleted = latest_deleted.order_by("-deleted_at")[:MAX_NUMBER_OF_DELETED_ITEMS]
     context["latest_deleted"] = latest_deleted
 
     return render(request, "scheduling/recent.html", context)
@@ -503,6 +601,57 @@ def change_summary(request):
     return render(request, "scheduling/change_summary.html", {"academic_years": dict(academic_years)})
 
 
+@login_required
+def conflict_report(request, term):
+    # scheduling/conflicts/FALL2023/?mine=1
+
+    context = {}
+
+    year = int(term[-4:])
+    semester = term[:-4].upper()
+    term = get_object_or_404(Term, year__exact=year, semester__exact=semester)
+    context["term"] = term
+
+    # every section of the term, a BIOL and a CHEM section can share a room
+    sections = list(
+        Schedule.objects.scheduled()
+        .filter(term=term, is_deleted=False)
+        .values(*CONFLICT_FIELDS, "course_id")
+    )
+    conflicts = find_conflicts(sections)
+
+    mine = bool(request.GET.get("mine"))
+    context["mine"] = mine
+    if mine:
+        profile = get_object_or_404(Profile, user=request.user)
+        subject_list = profile.subjects.split(",") if profile.subjects else []
+        my_courses = set(
+            Course.objects.filter(subject__in=subject_list).values_list("id", flat=True)
+        )
+        my_ids = {s["id"] for s in sections if s["course_id"] in my_courses}
+        for resource, overlaps in conflicts.items():
+            conflicts[resource] = {
+                key: days
+                for key, days in overlaps.items()
+                if key[1] in my_ids or key[2] in my_ids
+            }
+
+    context["max_number_of_conflicts"] = MAX_NUMBER_OF_CONFLICTS
+    context["conflict_lists"] = [
+        (
+            title,
+            len(conflicts[resource]),
+            get_conflict_list(conflicts[resource], model, MAX_NUMBER_OF_CONFLICTS),
+        )
+        for title, resource, model in [
+            ("Instructor", "instructor", Instructor),
+            ("Room", "location", Location),
+        ]
+    ]
+
+    return render(request, "scheduling/conflict_report.html", context)
+
+
 @login_required
 def deleted_schedules(request):
 
@@ -516,7 +665,7 @@ def deleted_schedules(request):
 
     course_list = Course.objects.filter(subject__in=subject_list)
 
-    deleted = Schedule.objects.filter(
+    deleted = Schedule.objects.with_related().filter(
         is_deleted=True, course__in=course_list
     ).order_by("-deleted_at")
     context["deleted"] = deleted
@@ -541,9 +690,9 @@ def change_summary_by_term(request, term):
     term = get_object_or_404(Term, year__exact=year, semester__exact=semester)
 
     context["term"] = term
-    course_list = Course.objects.filter(subject__in=subject_list)
 
-    gcis_changed, cams_changed, added, deleted, total_changes = get_diff_gcis_cams(term, course_list)
+    diff = get_change_summary(term, subject_list)
+    gcis_changed, cams_changed, added, deleted = hydrate_diff(diff)
     
     if added:
         added.sort(key=lambda s: (s.course.__str__(), s.course.name, s.section))
@@ -553,246 +702,27 @@ def change_summary_by_term(request, term):
 
     # it has to be a dict for changed_combined, otherwise it will be shown in the template
     changed_combined = {}
-    for s in gcis_changed:
+    for s in gcis_changed + cams_changed:
         if (s.course, s.section) not in changed_combined:
             changed_combined[(s.course, s.section)] = defaultdict(list)
-        changed_combined[(s.course, s.section)]["gcis"].append(s)
-
-    for s in cams_changed:
-        changed_combined[(s.course, s.section)]["cams"].append(s)
+        source = "cams" if isinstance(s, Cams) else "gcis"
+        changed_combined[(s.course, s.section)][source].append(s)
 
-    
-    gcis_changed_cols = defaultdict(list) 
-    cams_changed_cols = defaultdict(list)
-
-    for _, val_dict in changed_combined.items():
-        for gcis in val_dict["gcis"]:
-            for cams in val_dict["cams"]:
-                if gcis.status != cams.status:
-                    gcis_changed_cols['status'].append(gcis.id)
-                    cams_changed_cols['status'].append(cams.id)
-                if gcis.status not in ["CANCELED", "CLOSED"]:
-                    if gcis.capacity != cams.capacity:
-                        gcis_changed_cols['capacity'].append(gcis.id)
-                        cams_changed_cols['capacity'].append(cams.id)
-                    if gcis.instructor != cams.instructor:
-                        gcis_changed_cols['instructor'].append(gcis.id)
-                        cams_changed_cols['instructor'].append(cams.id)
-                    if gcis.campus != cams.campus:
-                        gcis_changed_cols['campus'].append(gcis.id)
-                        cams_changed_cols['campus'].append(cams.id)
-                    if gcis.location != cams.location:
-                        gcis_changed_cols['location'].append(gcis.id)
-                        cams_changed_cols['location'].append(cams.id)
-                    if cams.days and cams.days and gcis.days != cams.days:
-                        gcis_changed_cols['days'].append(gcis.id)
-                        cams_changed_cols['days'].append(cams.id)
-                    if gcis.start_time != cams.start_time:
-                        gcis_changed_cols['start_time'].append(gcis.id)
-                        cams_changed_cols['start_time'].append(cams.id)
-                    if gcis.stop_time != cams.stop_time:
-                        gcis_changed_cols['stop_time'].append(gcis.id)
-                        cams_changed_cols['stop_time'].append(cams.id)
-
-    context['gcis_changed_cols'] = gcis_changed_cols 
-    context['cams_changed_cols'] = cams_changed_cols 
+    context['gcis_changed_cols'] = diff.gcis_changed_cols
+    context['cams_changed_cols'] = diff.cams_changed_cols
     context["changed_combined"] = changed_combined
     context["added"] = added
     context["deleted"] = deleted
-    context["total_changes"] = total_changes
+    context["total_changes"] = diff.total_changes
 
     return render(request, "scheduling/change_summary_by_term.html", context)
 
 
-def get_diff_gcis_cams(term, course_list):
-
-    total_changes = 0
-    gcis_changed, cams_changed, added, deleted = [], [], [], []
-    
-    if term and course_list:
-
-        # get active schedules from GCIS
-        schedules_gcis = pd.DataFrame.from_records(
-            Schedule.objects.filter(course__in=course_list, term=term, is_deleted=False)
-            .all()
-            .values(
-                "id",
-                "term_id",
-                "course_id",
-                "section",
-                "capacity",
-                "instructor_id",
-                "status",
-                "campus_id",
-                "location_id",
-                "days",
-                "start_time",
-                "stop_time",
-            )
-        )
-        schedules_gcis.rename(columns={"id": "gcis_id"}, inplace=True)
-
-        # get all schedules from CAMS
-        schedules_cams = pd.DataFrame.from_records(
-            Cams.objects.filter(course__in=course_list, term=term)
-            .all()
-            .values(
-                "id",
-                "term_id",
-                "course_id",
-                "section",
-                "capacity",
-                "instructor_id",
-                "status",
-                "campus_id",
-                "location_id",
-                "days",
-                "start_time",
-                "stop_time",
-            )
-        )
-        schedules_cams.rename(columns={"id": "cams_id"}, inplace=True)
-
-        # if both empty, no changes
-        if schedules_gcis.empty and schedules_cams.empty:
-            return gcis_changed, cams_changed, added, deleted, total_changes
-
-        # if gcis is empty, delete all schedules in CAMS
-        if schedules_gcis.empty:
-            for _id in schedules_cams["cams_id"].values:
-                deleted.append(Cams.objects.get(pk=_id))
-            return gcis_changed, cams_changed, added, deleted, total_changes        
-
-        # clean up and get ready to merge
-        schedules_gcis.replace("", np.nan, inplace=True)
-        # days cannot be float type
-        schedules_gcis.days.replace(np.nan, None, inplace=True)
-
-        # change null to None, replace values where condition is False
-        schedules_gcis = schedules_gcis.where(pd.notnull(schedules_gcis), None)
-        schedules_cams = schedules_cams.where(pd.notnull(schedules_cams), None)
-
-        # make id an int64
-        schedules_gcis["gcis_id"] = schedules_gcis["gcis_id"].astype("Int64")
-        schedules_cams["cams_id"] = schedules_cams["cams_id"].astype("Int64")
-
-
-        # fix the error casused by N/A in a character column
-        for col in [
-            "term_id",
-            "course_id",
-            "capacity",
-            "instructor_id",
-            "campus_id",
-            "location_id",
-        ]:
-            schedules_cams[col] = schedules_cams[col].astype("Int64")
-            schedules_gcis[col] = schedules_gcis[col].astype("Int64")
-
-        
-        # merge two schedules
-        merged = schedules_gcis.merge(
-            schedules_cams,
-            how="outer",
-            on=[
-                "term_id",
-                "course_id",
-                "section",
-                "capacity",
-                "instructor_id",
-                "status",
-                "campus_id",
-                "location_id",
-                "days",
-                "start_time",
-                "stop_time",
-            ],
-            indicator=True,
-        )
-
-
-        not_in_both = merged.loc[merged["_merge"] != "both"]
-        not_in_both.reset_index(drop=True, inplace=True)
-        total_changes = len(not_in_both)
-
-        # change nan to None
-        not_in_both = not_in_both.where(pd.notnull(not_in_both), None)
-
-        # left is GCIS, right is CAMS
-        grouped = not_in_both.groupby(["term_id", "course_id", "section"])
-
-        # changed, there could be duplicated sections for one schedule
-        _changed = grouped.filter(lambda x: x["_merge"].count() >= 2)
-
-        # if both canceled or closed, these is no need to compare the rest
-        _both_canceled = (
-            _changed.loc[_changed["status"] == "CANCELED"]
-            .groupby(["term_id", "course_id", "section"])
-            .filter(lambda x: x["section"].count() == 2)
-        )
-
-        _both_closed = (
-            _changed.loc[_changed["status"] == "CLOSED"]
-            .groupby(["term_id", "course_id", "section"])
-            .filter(lambda x: x["section"].count() == 2)
-        )
-
-        _changed = _changed[~_changed.index.isin(list(_both_canceled.index))]
-        _changed = _changed[~_changed.index.isin(list(_both_closed.index))]
-        gcis_cids = _changed.loc[_changed["_merge"] == "left_only"]["gcis_id"].values
-        cams_cids = _changed.loc[_changed["_merge"] == "right_only"]["cams_id"].values
-        
-        for _id in gcis_cids:
-            gcis_changed.append(Schedule.objects.get(pk=_id))
-        for _id in cams_cids:
-            cams_changed.append(Cams.objects.get(pk=_id))
-
-        # added
-        _added = not_in_both.loc[not_in_both["_merge"] == "left_only"]
-        _added = _added[
-            ~_added.index.isin(
-                list(_changed.index)
-                + list(_both_canceled.index)
-                + list(_both_closed.index)
-            )
-        ]
-
-        added = []
-        for _id in _added["gcis_id"].values:
-            added.append(Schedule.objects.get(pk=_id))
-
-        # if a course is canceled in the added section, then it was deleted in CAMS
-        # it is safe to hide them, but better to reset the database
-        # added = added.loc[added['status'] not in ['CANCELED', 'CLOSED']]
-
-
-        # deleted
-        _deleted = not_in_both.loc[not_in_both["_merge"] == "right_only"]
-        _deleted = _deleted[
-            ~_deleted.index.isin(
-                list(_changed.index)
-                + list(_both_canceled.index)
-                + list(_both_closed.index)
-            )
-        ]
-
-        # marked as deleted in GCIS
-        deleted = Schedule.objects.filter(term=term, course__in=course_list, is_deleted=True, status__in=["OPEN"])
-
-        schedule_not_existing_in_CAMS = []
-        for schedule in deleted:
-            term = schedule.term
-            course = schedule.course
-            section = schedule.section
-            in_cams = Cams.objects.filter(term=term, course=course, section=section)
-            if not in_cams:
-                schedule_not_existing_in_CAMS.append(schedule.pk)
-        deleted = list(deleted.exclude(pk__in=schedule_not_existing_in_CAMS))
-
-        for _id in _deleted["cams_id"].values:
-            deleted.append(Cams.objects.get(pk=_id))
-
-    return gcis_changed, cams_changed, added, deleted, total_changes
+def get_diff_gcis_cams(term, course_list, engine=None):
+    """changed, added and deleted schedules between GCIS and CAMS"""
+    diff = diff_gcis_cams(term, course_list, engine)
+    gcis_changed, cams_changed, added, deleted = hydrate_diff(diff)
+    return gcis_changed, cams_changed, added, deleted, diff.total_changes
 
 
 def reformat_datetime(dt: datetime):
@@ -802,12 +732,113 @@ def reformat_datetime(dt: datetime):
     return dt.strftime("%m/%d/%Y, %H:%M:%S")
 
 
+class Echo:
+    """file-like object for csv.writer that hands back each written line"""
+
+    def write(self, value):
+        return value
+
+
+CHANGE_SUMMARY_CSV_HEADER = [
+    "Term",
+    "Course",
+    "Section",
+    "Name",
+    "Status",
+    "Capacity",
+    "Instructor",
+    "Campus",
+    "Location",
+    "Days",
+    "Start",
+    "Stop",
+    "Note",
+    "source",
+    "Inserted_by",
+    "Inserted_date",
+    "Updated_by",
+    "Updated_date",
+    "Deleted_by",
+    "Deleted_date",
+    "Action",
+]
+
+
+def schedule_csv_row(s, action):
+    return [
+        s.term,
+        s.course,
+        s.section,
+        s.course.name,
+        s.status,
+        s.capacity,
+        s.instructor,
+        s.campus,
+        s.location,
+        s.days,
+        s.start_time,
+        s.stop_time,
+        s.notes,
+        "GCIS",
+        s.insert_by,
+        reformat_datetime(s.insert_date),
+        s.update_by,
+        reformat_datetime(s.update_date),
+        s.deleted_by,
+        reformat_datetime(s.deleted_at),
+        action,
+    ]
+
+
+def cams_csv_row(c, action):
+    return [
+        c.term,
+        c.course,
+        c.section,
+        c.course.name,
+        c.status,
+        c.capacity,
+        c.instructor,
+        c.campus,
+        c.location,
+        c.days,
+        c.start_time,
+        c.stop_time,
+        "",
+        "CAMS",
+        "",
+        "",
+        "",
+        "",
+        "",
+        "",
+        action,
+    ]
+
+
+def change_summary_csv_lines(term, subject_list):
+    """csv lines of the change summary, rows are loaded in chunks"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CHANGE_SUMMARY_CSV_HEADER)
+
+    diff = get_change_summary(term, subject_list)
+    for s in iter_hydrate(Schedule.objects, diff.gcis_changed):
+        yield writer.writerow(schedule_csv_row(s, "CHANGE"))
+    for c in iter_hydrate(Cams.live, diff.cams_changed):
+        yield writer.writerow(cams_csv_row(c, "CHANGE"))
+    for s in iter_hydrate(Schedule.objects, diff.deleted_gcis):
+        yield writer.writerow(schedule_csv_row(s, "DELETE"))
+    for c in iter_hydrate(Cams.live, diff.deleted_cams):
+        yield writer.writerow(cams_csv_row(c, "DELETE (in-cams-only)"))
+    for s in iter_hydrate(Schedule.objects, diff.added):
+        yield writer.writerow(schedule_csv_row(s, "ADD"))
+
+
 @login_required
 def download_change_summary_by_term(request, term):
 
     now = datetime.now().strftime("%m%d%Y")
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="{term.lower()}-schedule-changes-{now}.csv"'
+    filename = f"{term.lower()}-schedule-changes-{now}.csv"
 
     profile = get_object_or_404(Profile, user=request.user)
     if profile.subjects:
@@ -819,170 +850,9 @@ def download_change_summary_by_term(request, term):
     semester = term[:-4].upper()  # Term
     term = get_object_or_404(Term, year__exact=year, semester__exact=semester)
 
-    course_list = Course.objects.filter(subject__in=subject_list)
-
-    gcis_changed, cams_changed, added, deleted, _ = get_diff_gcis_cams(term, course_list)
-
     # write data to csv file so that user can download
-    writer = csv.writer(response)
-
-    writer.writerow(
-        [
-            "Term",
-            "Course",
-            "Section",
-            "Name",
-            "Status",
-            "Capacity",
-            "Instructor",
-            "Campus",
-            "Location",
-            "Days",
-            "Start",
-            "Stop",
-            "Note",
-            "source",
-            "Inserted_by",
-            "Inserted_date",
-            "Updated_by",
-            "Updated_date",
-            "Deleted_by",
-            "Deleted_date",
-            "Action",
-        ]
+    response = StreamingHttpResponse(
+        change_summary_csv_lines(term, subject_list), content_type="text/csv"
     )
-    for s in gcis_changed:
-        writer.writerow(
-            [
-                s.term,
-                s.course,
-                s.section,
-                s.course.name,
-                s.status,
-                s.capacity,
-                s.instructor,
-                s.campus,
-                s.location,
-                s.days,
-                s.start_time,
-                s.stop_time,
-                s.notes,
-                "GCIS",
-                s.insert_by,
-                reformat_datetime(s.insert_date),
-                s.update_by,
-                reformat_datetime(s.update_date),
-                s.deleted_by,
-                reformat_datetime(s.deleted_at),
-                "CHANGE"
-            ]
-        )
-    for c in cams_changed:
-        writer.writerow(
-            [
-                c.term,
-                c.course,
-                c.section,
-                c.course.name,
-                c.status,
-                c.capacity,
-                c.instructor,
-                c.campus,
-                c.location,
-                c.days,
-                c.start_time,
-                c.stop_time,
-                "",
-                "CAMS",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-                "CHANGE"
-            ]
-        )
-
-    for s in deleted:
-        if isinstance(s, Cams):
-            writer.writerow(
-                [
-                    s.term,
-                    s.course,
-                    s.section,
-                    s.course.name,
-                    s.status,
-                    s.capacity,
-                    s.instructor,
-                    s.campus,
-                    s.location,
-                    s.days,
-                    s.start_time,
-                    s.stop_time,
-                    "",
-                    "CAMS",
-                    "",
-                    "",
-                    "",
-                    "",
-                    "",
-                    "",
-                    "DELETE (in-cams-only)"
-                ]
-            )
-        else:
-            writer.writerow(
-                [
-                    s.term,
-                    s.course,
-                    s.section,
-                    s.course.name,
-                    s.status,
-                    s.capacity,
-                    s.instructor,
-                    s.campus,
-                    s.location,
-                    s.days,
-                    s.start_time,
-                    s.stop_time,
-                    s.notes,
-                    "GCIS",
-                    s.insert_by,
-                    reformat_datetime(s.insert_date),
-                    s.update_by,
-                    reformat_datetime(s.update_date),
-                    s.deleted_by,
-                    reformat_datetime(s.deleted_at),                
-                    "DELETE",
-                ]
-            )
-
-    for s in added:
-        writer.writerow(
-            [
-                s.term,
-                s.course,
-                s.section,
-                s.course.name,
-                s.status,
-                s.capacity,
-                s.instructor,
-                s.campus,
-                s.location,
-                s.days,
-                s.start_time,
-                s.stop_time,
-                s.notes,
-                "GCIS",
-                s.insert_by,
-                reformat_datetime(s.insert_date),
-                s.update_by,
-                reformat_datetime(s.update_date),
-                s.deleted_by,
-                reformat_datetime(s.deleted_at),  
-                "ADD",
-            ]
-        )
-
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response